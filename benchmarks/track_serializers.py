@@ -0,0 +1,107 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import argparse
+import os
+import time
+
+import django
+
+"""
+Compare DRF's ModelSerializer with the .values() projection serializer of
+trackhubs.api.serializers for a track listing, on a seeded dataset.
+
+It seeds a test database created next to the database of the Django settings
+(DJANGO_SETTINGS_MODULE, thr.settings by default), as check_query_plans does, and
+destroys it when done: the configured database is never written to. Run from the
+repository root with:
+
+    python -m benchmarks.track_serializers --rows 10000 100000 1000000
+"""
+
+SEED_BATCH_SIZE = 5000
+
+
+def seed(rows):
+    """
+    :returns: the hub of the seeded tracks
+    """
+    from django.contrib.auth.models import User
+    from trackhubs.blobs import store_blobs
+    from trackhubs.models import Assembly, Genome, Hub, Track
+
+    owner, _ = User.objects.get_or_create(username='benchmark-track-serializers')
+    hub = Hub.objects.create(owner=owner, url='http://benchmark.invalid/{}/hub.txt'.format(rows), name='benchmark',
+                             short_label='Benchmark hub')
+    assembly, _ = Assembly.objects.get_or_create(name='benchmark-assembly')
+    genome = Genome.objects.create(hub=hub, assembly=assembly, trackdb_url='http://benchmark.invalid/trackDb.txt')
+    for start in range(0, rows, SEED_BATCH_SIZE):
+        tracks = []
+        for i in range(start, min(start + SEED_BATCH_SIZE, rows)):
+            track = Track(genome=genome, hub=hub, name='track{}'.format(i))
+            track.settings = {
+                'track': 'track{}'.format(i), 'type': 'bigWig', 'parent': 'composite{} on'.format(i // 100),
+                'shortLabel': 'Track {}'.format(i), 'visibility': 'dense',
+                'bigDataUrl': 'https://data.example.org/track{}.bw'.format(i),
+            }
+            tracks.append(track)
+        store_blobs({track.blob_id: track.settings for track in tracks})
+        Track.objects.bulk_create(tracks)
+    return hub
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Track listing serialization benchmark')
+    arg_parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+    args = arg_parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'thr.settings')
+    django.setup()
+    from django.db import connection
+    from rest_framework import serializers
+    from trackhubs.api.serializers import TrackProjection
+    from trackhubs.models import Track
+
+    class TrackModelSerializer(serializers.ModelSerializer):
+        hub = serializers.IntegerField(source='hub_id')
+        assembly = serializers.CharField(source='genome.assembly.name')
+        type = serializers.CharField(source='file_type')
+
+        class Meta:
+            model = Track
+            fields = ['id', 'name', 'hub', 'assembly', 'type', 'parent', 'visibility', 'short_label']
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        print('{:>10}{:>22}{:>22}{:>10}'.format('rows', 'ModelSerializer (s)', 'projection (s)', 'speedup'))
+        for rows in args.rows:
+            tracks = Track.objects.filter(hub=seed(rows)).order_by('pk')
+
+            start = time.perf_counter()
+            model_data = TrackModelSerializer(tracks.select_related('genome__assembly'), many=True).data
+            model_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            projection_data = TrackProjection(tracks).data
+            projection_time = time.perf_counter() - start
+
+            assert [dict(row) for row in model_data] == projection_data
+            print('{:>10}{:>22.2f}{:>22.2f}{:>9.1f}x'.format(
+                rows, model_time, projection_time, model_time / projection_time))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
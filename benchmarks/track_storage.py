@@ -0,0 +1,161 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import argparse
+import json
+import random
+import sqlite3
+import time
+
+from trackhubs.codec import decode_settings, encode_settings, promoted_settings
+
+"""
+Compare the storage and read cost of track settings stored as
+    - one row per setting (naive entity-attribute-value table),
+    - a verbose JSON document per track,
+    - the compact blob of trackhubs.codec with promoted indexed columns.
+
+The layouts are materialised in a SQLite database (in memory by default) so
+the sizes include row and index overhead. Absolute numbers differ on MySQL
+but the ratios are representative. Run from the repository root with:
+
+    python -m benchmarks.track_storage --tracks 100000
+"""
+
+FILE_TYPES = ['bigWig', 'bigBed 6 +', 'bam', 'vcfTabix', 'bigBed 12']
+
+
+def make_stanzas(count, seed=0):
+    """
+    Generate trackDb stanzas shaped like the ones of a large ENCODE style hub:
+    composites of 100 subtracks sharing most of their settings
+    """
+    rng = random.Random(seed)
+    stanzas = []
+    for i in range(count):
+        composite = 'composite{}'.format(i // 100)
+        file_type = FILE_TYPES[(i // 100) % len(FILE_TYPES)]
+        stanzas.append({
+            'track': 'track{}'.format(i),
+            'parent': '{} on'.format(composite),
+            'type': file_type,
+            'bigDataUrl': 'https://data.example.org/files/ENCFF{:06d}/ENCFF{:06d}.{}'.format(
+                i, i, file_type.split()[0]),
+            'shortLabel': 'H3K{}me3 rep{}'.format(rng.randint(1, 36), rng.randint(1, 4)),
+            'longLabel': 'H3K{}me3 ChIP-seq of {} tissue, replicate {}'.format(
+                rng.randint(1, 36), rng.choice(['liver', 'heart', 'lung', 'brain']), rng.randint(1, 4)),
+            'subGroups': 'view=signal tissue=t{} rep=r{}'.format(rng.randint(1, 50), rng.randint(1, 4)),
+            'color': '{},{},{}'.format(rng.randint(0, 255), rng.randint(0, 255), rng.randint(0, 255)),
+            'visibility': rng.choice(['dense', 'full', 'hide']),
+            'maxHeightPixels': '64:32:16',
+            'autoScale': 'on',
+        })
+    return stanzas
+
+
+def database_size(db):
+    page_count = db.execute('PRAGMA page_count').fetchone()[0]
+    page_size = db.execute('PRAGMA page_size').fetchone()[0]
+    return page_count * page_size
+
+
+def load_eav(db, stanzas):
+    db.execute('CREATE TABLE track (id INTEGER PRIMARY KEY, name TEXT)')
+    db.execute('CREATE TABLE track_setting (id INTEGER PRIMARY KEY, track_id INTEGER, key TEXT, value TEXT)')
+    db.execute('CREATE INDEX track_setting_track ON track_setting (track_id, key)')
+    db.execute('CREATE INDEX track_setting_key ON track_setting (key, value)')
+    db.executemany('INSERT INTO track VALUES (?, ?)', ((pk, s['track']) for pk, s in enumerate(stanzas)))
+    db.executemany('INSERT INTO track_setting (track_id, key, value) VALUES (?, ?, ?)',
+                   ((pk, key, value) for pk, s in enumerate(stanzas) for key, value in s.items()))
+
+
+def read_eav(db, file_type):
+    tracks = {}
+    rows = db.execute(
+        'SELECT s.track_id, s.key, s.value FROM track_setting s WHERE s.track_id IN '
+        '(SELECT track_id FROM track_setting WHERE key = ? AND value = ?) ORDER BY s.track_id',
+        ('type', file_type))
+    for track_id, key, value in rows:
+        tracks.setdefault(track_id, {})[key] = value
+    return len(tracks)
+
+
+def load_json(db, stanzas):
+    db.execute('CREATE TABLE track (id INTEGER PRIMARY KEY, name TEXT, settings TEXT)')
+    db.executemany('INSERT INTO track VALUES (?, ?, ?)',
+                   ((pk, s['track'], json.dumps(s, indent=1)) for pk, s in enumerate(stanzas)))
+
+
+def read_json(db, file_type):
+    # without promoted columns every document has to be decoded to filter
+    count = 0
+    for settings, in db.execute('SELECT settings FROM track'):
+        if json.loads(settings)['type'] == file_type:
+            count += 1
+    return count
+
+
+def load_compact(db, stanzas):
+    db.execute('CREATE TABLE track (id INTEGER PRIMARY KEY, name TEXT, settings_blob BLOB, '
+               'file_type TEXT, parent TEXT, visibility TEXT, short_label TEXT)')
+    db.execute('CREATE INDEX track_file_type ON track (file_type)')
+    rows = []
+    for pk, stanza in enumerate(stanzas):
+        promoted = promoted_settings(stanza)
+        rows.append((pk, stanza['track'], encode_settings(stanza), promoted['file_type'],
+                     promoted['parent'], promoted['visibility'], promoted['short_label']))
+    db.executemany('INSERT INTO track VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+
+
+def read_compact(db, file_type):
+    count = 0
+    for blob, in db.execute('SELECT settings_blob FROM track WHERE file_type = ?', (file_type.split()[0],)):
+        decode_settings(blob)
+        count += 1
+    return count
+
+
+LAYOUTS = [
+    ('EAV rows', load_eav, read_eav),
+    ('verbose JSON', load_json, read_json),
+    ('compact blob', load_compact, read_compact),
+]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Track settings storage benchmark')
+    arg_parser.add_argument('--tracks', type=int, default=100000, help='number of tracks to store')
+    arg_parser.add_argument('--database', default=':memory:', help='SQLite file, in memory by default')
+    args = arg_parser.parse_args()
+
+    stanzas = make_stanzas(args.tracks)
+    print('{} tracks, {} settings'.format(len(stanzas), sum(len(s) for s in stanzas)))
+    print('{:<14}{:>14}{:>14}{:>18}'.format('layout', 'size (MB)', 'bytes/track', 'read 1 type (ms)'))
+    for label, load, read in LAYOUTS:
+        db = sqlite3.connect(args.database)
+        for table, in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+            db.execute('DROP TABLE {}'.format(table))
+        db.execute('VACUUM')
+        load(db, stanzas)
+        db.commit()
+        db.execute('VACUUM')
+        size = database_size(db)
+        start = time.perf_counter()
+        read(db, FILE_TYPES[0])
+        elapsed = time.perf_counter() - start
+        print('{:<14}{:>14.1f}{:>14.0f}{:>18.1f}'.format(label, size / 2 ** 20, size / len(stanzas), elapsed * 1000))
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
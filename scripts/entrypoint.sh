@@ -5,4 +5,6 @@ set -e
 python manage.py collectstatic --noinput
 
 # Command that runs the app using uWSGI
-uwsgi --socket :8000 --master --enable-threads --module thr.wsgi
\ No newline at end of file
+# --lazy-apps loads (and warms up) the app in each worker rather than in the master,
+# so that DB connections aren't shared between forked workers
+uwsgi --socket :8000 --master --enable-threads --lazy-apps --need-app --module thr.wsgi
\ No newline at end of file
@@ -58,6 +58,7 @@ INSTALLED_APPS = [
     'rest_framework.authtoken',
     'thr_web.apps.ThrWebConfig',
     'users.apps.UsersConfig',
+    'trackhubs.apps.TrackhubsConfig',
 ]
 
 REST_FRAMEWORK = {
@@ -97,6 +98,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'thr.wsgi.application'
 
+# Populate URLs, templates, DRF and DB connections when a worker loads thr.wsgi
+WARMUP_ON_STARTUP = bool(int(os.environ.get('THR_WARMUP', 0)))
+
 # To uncomment later
 # https://docs.djangoproject.com/en/3.0/topics/auth/customizing/#substituting-a-custom-user-model
 # AUTH_USER_MODEL = 'thr.users'
@@ -116,6 +120,20 @@ DATABASES = {
 }
 
 
+# Internal address of the nginx proxy, used to refresh its API cache when a hub changes
+# (see proxy/default.conf), e.g. http://proxy:8081
+PROXY_CACHE_REFRESH_URL = os.environ.get('THR_PROXY_REFRESH_URL', '')
+
+
+# Shared cache, behind the per-worker LRU of trackhubs/cache.py
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('THR_CACHE_BACKEND', 'django.core.cache.backends.memcached.MemcachedCache'),
+        'LOCATION': os.environ.get('THR_CACHE_LOCATION', 'memcached:11211'),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -168,3 +186,7 @@ LOGIN_URL = 'login'
 
 EMAIL_HOST = "localhost"
 EMAIL_PORT = 1025
+
+# Emails are queued in the DB and sent by the send_queued_mail command, see thr_web/mail.py
+EMAIL_BACKEND = 'thr_web.mail.QueuedEmailBackend'
+QUEUED_EMAIL_DELIVERY_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
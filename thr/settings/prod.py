@@ -1,2 +1,13 @@
 from .base import *
 DEBUG = False
+
+WARMUP_ON_STARTUP = bool(int(os.environ.get('THR_WARMUP', 1)))
+
+# Keep compiled templates in memory, the workers are warmed up with all of them
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
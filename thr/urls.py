@@ -41,5 +41,7 @@ urlpatterns = [
 
     # REST Framework URLs
     path('api/user/', include('users.api.urls'), name='thr_users_api'),
-    # path('api/trackhub/', include('trackhubs.api.urls'), name='thr_trackhub_api'),
+    path('api/trackhub/', include('trackhubs.api.urls'), name='thr_trackhub_api'),
+    path('api/search/', include('trackhubs.api.search_urls'), name='thr_search_api'),
+    path('api/suggest/', include('trackhubs.api.suggest_urls'), name='thr_suggest_api'),
 ]
@@ -0,0 +1,155 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import os
+import time
+
+from django.db import connections
+from django.template import TemplateSyntaxError, engines
+from django.template.backends.django import DjangoTemplates
+from django.template.utils import get_app_template_dirs
+from django.urls import get_resolver
+
+"""
+Warm-up of a freshly loaded worker, so that the first requests it serves
+don't pay for the lazy initialisation Django and DRF do on first use.
+
+Every step is best effort: a failure is logged but never prevents the
+worker from starting.
+"""
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt')
+
+
+def populate_url_resolver():
+    """
+    Import every URLconf and build the reverse lookup tables
+    :returns: the number of URL names known to the resolver
+    """
+    resolver = get_resolver()
+    return len(resolver.reverse_dict)
+
+
+def _template_names(directory):
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if filename.endswith(TEMPLATE_EXTENSIONS):
+                yield os.path.relpath(os.path.join(root, filename), directory)
+
+
+def compile_templates():
+    """
+    Load every template of the Django template engines. With the cached
+    loader (see settings/prod.py) the compiled templates stay in memory
+    :returns: the number of templates compiled
+    """
+    compiled = 0
+    for engine in engines.all():
+        if not isinstance(engine, DjangoTemplates):
+            continue
+        directories = list(engine.engine.dirs)
+        if any('app_directories' in str(loader) for loader in engine.engine.loaders):
+            directories.extend(get_app_template_dirs('templates'))
+        for directory in directories:
+            for name in _template_names(directory):
+                try:
+                    engine.get_template(name)
+                    compiled += 1
+                except TemplateSyntaxError:
+                    # some templates are fragments meant to be included
+                    # from contexts that load extra tag libraries
+                    logger.debug('Skipping template %s', name)
+    return compiled
+
+
+def set_up_rest_framework():
+    """
+    Import the DRF classes configured in the settings and resolve
+    the settings of the API views, which DRF otherwise does on first request
+    :returns: the number of API views set up
+    """
+    from rest_framework.settings import api_settings
+    from rest_framework.views import APIView
+
+    for setting in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES', 'DEFAULT_AUTHENTICATION_CLASSES',
+                    'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_CONTENT_NEGOTIATION_CLASS', 'EXCEPTION_HANDLER'):
+        getattr(api_settings, setting)
+
+    views = 0
+    pending = [get_resolver()]
+    while pending:
+        for pattern in pending.pop().url_patterns:
+            if hasattr(pattern, 'url_patterns'):
+                pending.append(pattern)
+                continue
+            view_class = getattr(pattern.callback, 'cls', None)
+            if view_class is not None and issubclass(view_class, APIView):
+                view = view_class()
+                view.get_renderers()
+                view.get_parsers()
+                view.get_authenticators()
+                view.get_permissions()
+                view.get_content_negotiator()
+                views += 1
+    return views
+
+
+def connect_databases():
+    """
+    Open the connection to every configured database
+    :returns: the number of connections opened
+    """
+    for connection in connections.all():
+        connection.ensure_connection()
+    return len(connections.all())
+
+
+def build_suggest_index():
+    """
+    Load the names suggested by the typeahead into memory, see trackhubs/suggest.py
+    :returns: the number of entries of the index
+    """
+    from trackhubs.suggest import suggest_index
+
+    return suggest_index.build()
+
+
+WARMUP_STEPS = [
+    ('urls', populate_url_resolver),
+    ('templates', compile_templates),
+    ('rest_framework', set_up_rest_framework),
+    ('databases', connect_databases),
+    ('suggest', build_suggest_index),
+]
+
+
+def warm_up():
+    """
+    Run all the warm-up steps
+    :returns: a dict of step name to duration in seconds, None if the step failed
+    """
+    timings = {}
+    for name, step in WARMUP_STEPS:
+        start = time.perf_counter()
+        try:
+            result = step()
+        except Exception:
+            logger.exception('Warm-up step %s failed', name)
+            timings[name] = None
+            continue
+        timings[name] = time.perf_counter() - start
+        logger.info('Warm-up %s: %s in %.1f ms', name, result, timings[name] * 1000)
+    return timings
@@ -28,3 +28,10 @@ https://docs.djangoproject.com/en/3.1/howto/deployment/wsgi/
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'thr.settings')
 
 application = get_wsgi_application()
+
+# Get the worker ready before it accepts traffic, see warmup.py
+from django.conf import settings  # noqa: E402
+
+if settings.WARMUP_ON_STARTUP:
+    from .warmup import warm_up
+    warm_up()
@@ -13,5 +13,62 @@
 """
 
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .models import QueuedEmail
+
+# Below this many rows an exact count is cheap enough
+ESTIMATE_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator using the row count estimated by MySQL from the table statistics
+    for unfiltered querysets over large tables, rather than an exact COUNT(*)
+    which scans the whole table
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimated_count(self.object_list.model, self.object_list.db)
+            if estimate is not None and estimate > ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+def estimated_count(model, using='default'):
+    """
+    :returns: the number of rows of the model table estimated by the database, None if not available
+    """
+    connection = connections[using]
+    if connection.vendor != 'mysql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+            [model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Base admin for tables too large for the default changelist: estimated counts, no full result
+    count when filtering. Subclasses should only search on indexed columns
+    (prefix '^' or exact '=' lookups) and avoid list_filter on large columns
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+@admin.register(QueuedEmail)
+class QueuedEmailAdmin(LargeTableAdmin):
+    list_display = ('pk', 'recipients', 'created_at', 'attempts', 'sent_at')
+    exclude = ('message',)
+    readonly_fields = ('from_email', 'recipients', 'created_at', 'last_error', 'sent_at')
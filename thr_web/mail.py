@@ -0,0 +1,174 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import email
+import logging
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import MIMEMixin
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import QueuedEmail
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+# delay before the first retry, doubled at each attempt
+RETRY_DELAY = timedelta(minutes=1)
+# time a worker has to send the emails it claimed, they are retried by any worker after that
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+class QueuedEmailBackend(BaseEmailBackend):
+    """
+    Email backend storing the messages in the database and returning immediately,
+    so that sending emails (e.g. password reset) never waits on the SMTP server
+    """
+
+    def send_messages(self, email_messages):
+        queued = [
+            QueuedEmail(
+                from_email=message.from_email,
+                recipients='\n'.join(message.recipients()),
+                message=message.message().as_bytes(),
+            )
+            for message in email_messages if message.recipients()
+        ]
+        QueuedEmail.objects.bulk_create(queued)
+        return len(queued)
+
+
+class _RawMessage(MIMEMixin, email.message.Message):
+    pass
+
+
+class QueuedEmailMessage(EmailMessage):
+    """
+    A queued email, handed as is to the delivery backend
+    """
+
+    def __init__(self, queued_email):
+        super().__init__(from_email=queued_email.from_email, to=queued_email.recipients.split('\n'))
+        self.raw = bytes(queued_email.message)
+
+    def message(self):
+        return email.message_from_bytes(self.raw, _class=_RawMessage)
+
+
+def due_emails():
+    return QueuedEmail.objects.filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now()),
+        sent_at__isnull=True, attempts__lt=MAX_ATTEMPTS,
+    ).order_by('pk')
+
+
+def claim_emails(batch_size):
+    """
+    Take due emails for this worker: they aren't due for the other workers
+    until CLAIM_TIMEOUT, by which time they are sent or rescheduled
+    :returns: the list of the QueuedEmails claimed
+    """
+    with transaction.atomic():
+        queued_emails = list(due_emails().select_for_update()[:batch_size])
+        QueuedEmail.objects.filter(pk__in=[queued_email.pk for queued_email in queued_emails]).update(
+            next_attempt_at=timezone.now() + CLAIM_TIMEOUT)
+    return queued_emails
+
+
+def _postpone(queued_emails):
+    """
+    Retry emails after RETRY_DELAY, without counting an attempt
+    """
+    QueuedEmail.objects.filter(pk__in=[queued_email.pk for queued_email in queued_emails]).update(
+        next_attempt_at=timezone.now() + RETRY_DELAY)
+
+
+def _open(connection, count):
+    try:
+        connection.open()
+    except Exception as error:
+        logger.warning('Unable to connect to deliver %s emails: %s', count, error)
+        return False
+    return True
+
+
+def _record_failure(queued_email, error):
+    queued_email.attempts += 1
+    queued_email.last_error = str(error)
+    queued_email.next_attempt_at = timezone.now() + RETRY_DELAY * 2 ** (queued_email.attempts - 1)
+    if queued_email.attempts < MAX_ATTEMPTS:
+        logger.warning('Sending email %s failed (attempt %s): %s', queued_email.pk, queued_email.attempts, error)
+    else:
+        logger.error('Sending email %s to %s failed %s times, given up: %s', queued_email.pk,
+                     queued_email.recipients.replace('\n', ', '), queued_email.attempts, error)
+        # the content (e.g. a password reset link) isn't kept
+        queued_email.message = b''
+    queued_email.save(update_fields=['attempts', 'last_error', 'next_attempt_at', 'message'])
+
+
+def send_queued_mail(batch_size=100):
+    """
+    Send a batch of the queued emails that are due, over a single connection.
+    Failed messages are retried later with an exponential backoff, up to MAX_ATTEMPTS times.
+    If the connection can't be opened, or is lost and can't be opened again, the emails left
+    are retried after RETRY_DELAY, without counting an attempt.
+    The content of the emails is removed once they are sent
+    :param batch_size: the maximum number of emails to send
+    :returns: the number of emails sent and failed
+    """
+    queued_emails = claim_emails(batch_size)
+    if not queued_emails:
+        return 0, 0
+
+    connection = get_connection(settings.QUEUED_EMAIL_DELIVERY_BACKEND, fail_silently=False)
+    if not _open(connection, len(queued_emails)):
+        _postpone(queued_emails)
+        return 0, 0
+
+    sent = failed = 0
+    with connection:
+        position = 0
+        reconnected = False
+        while position < len(queued_emails):
+            queued_email = queued_emails[position]
+            try:
+                connection.send_messages([QueuedEmailMessage(queued_email)])
+            except smtplib.SMTPServerDisconnected as error:
+                connection.close()
+                if not _open(connection, len(queued_emails) - position):
+                    _postpone(queued_emails[position:])
+                    break
+                if not reconnected:
+                    # the server went away, not necessarily because of this email
+                    reconnected = True
+                    continue
+                _record_failure(queued_email, error)
+                failed += 1
+            except Exception as error:
+                _record_failure(queued_email, error)
+                failed += 1
+            else:
+                queued_email.attempts += 1
+                queued_email.sent_at = timezone.now()
+                queued_email.message = b''
+                queued_email.save(update_fields=['attempts', 'sent_at', 'message'])
+                sent += 1
+            position += 1
+            reconnected = False
+    return sent, failed
@@ -0,0 +1,37 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from thr_web.mail import send_queued_mail
+
+
+class Command(BaseCommand):
+    help = 'Send the queued emails in batches, each batch over a single SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--loop', action='store_true', help='keep running, polling the queue')
+        parser.add_argument('--interval', type=float, default=5, help='seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_mail(options['batch_size'])
+            if sent or failed:
+                self.stdout.write('{} sent, {} failed'.format(sent, failed))
+            if sent + failed < options['batch_size']:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
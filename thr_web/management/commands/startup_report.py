@@ -0,0 +1,103 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: loads thr.wsgi the way uWSGI does and times
+# each app's models import and ready(), then optionally the warm-up
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from django.apps import AppConfig
+timings = {'models': {}, 'ready': {}}
+original_create = AppConfig.create.__func__
+
+def timed(kind, config, method):
+    def wrapper(*args, **kwargs):
+        begin = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            timings[kind][config.label] = time.perf_counter() - begin
+    return wrapper
+
+def create(cls, entry):
+    config = original_create(cls, entry)
+    config.import_models = timed('models', config, config.import_models)
+    config.ready = timed('ready', config, config.ready)
+    return config
+
+AppConfig.create = classmethod(create)
+import thr.wsgi
+timings['wsgi'] = time.perf_counter() - start
+if '--warmup' in sys.argv:
+    from thr.warmup import warm_up
+    timings['warmup'] = warm_up()
+sys.stdout.write(json.dumps(timings))
+"""
+
+
+def _parse_importtime(stderr):
+    """
+    Sum the self import time of modules by top level package
+    :param stderr: the output of python -X importtime
+    :returns: a dict of package to seconds
+    """
+    packages = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, _, module = line[len('import time:'):].split('|')
+        packages[module.strip().split('.')[0]] += int(self_us) / 1e6
+    return packages
+
+
+class Command(BaseCommand):
+    help = 'Report where the time goes when a worker loads thr.wsgi: imports, app loading and warm-up'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help='number of packages to list by import time')
+        parser.add_argument('--warmup', action='store_true', help='also time the warm-up steps')
+
+    def handle(self, *args, **options):
+        command = [sys.executable, '-X', 'importtime', '-c', PROBE]
+        if options['warmup']:
+            command.append('--warmup')
+        # keep the warm-up out of the thr.wsgi load time, it is reported separately
+        env = dict(os.environ, THR_WARMUP='0')
+        process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 universal_newlines=True, env=env)
+        if process.returncode:
+            raise CommandError('Loading thr.wsgi failed:\n{}'.format(process.stderr[-2000:]))
+        timings = json.loads(process.stdout)
+        imports = _parse_importtime(process.stderr)
+
+        self.stdout.write('thr.wsgi loaded in {:.1f} ms'.format(timings['wsgi'] * 1000))
+        self.stdout.write('  imports (whole process): {:.1f} ms'.format(sum(imports.values()) * 1000))
+        for package, seconds in sorted(imports.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write('    {:<30}{:>10.1f} ms'.format(package, seconds * 1000))
+        for kind in ('models', 'ready'):
+            self.stdout.write('  app {}: {:.1f} ms'.format(kind, sum(timings[kind].values()) * 1000))
+            for label, seconds in sorted(timings[kind].items(), key=lambda item: -item[1]):
+                self.stdout.write('    {:<30}{:>10.1f} ms'.format(label, seconds * 1000))
+        if options['warmup']:
+            self.stdout.write('  warm-up:')
+            for step, seconds in timings['warmup'].items():
+                duration = 'failed' if seconds is None else '{:.1f} ms'.format(seconds * 1000)
+                self.stdout.write('    {:<30}{:>13}'.format(step, duration))
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.13 on 2026-10-19 09:30
+
+from django.db import migrations
+
+
+def clear_sent_messages(apps, schema_editor):
+    QueuedEmail = apps.get_model('thr_web', 'QueuedEmail')
+    QueuedEmail.objects.filter(sent_at__isnull=False).update(message=b'')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('thr_web', '0001_queued_email'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_sent_messages, migrations.RunPython.noop),
+    ]
@@ -14,4 +14,26 @@
 
 from django.db import models
 
-# Create your models here.
+
+class QueuedEmail(models.Model):
+    """
+    An outgoing email stored by thr_web.mail.QueuedEmailBackend,
+    as the raw MIME message, until the send_queued_mail command delivers it
+    or gives up (the message is then emptied)
+    """
+    from_email = models.CharField(max_length=255)
+    recipients = models.TextField(help_text='One address per line')
+    message = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['sent_at', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return '{} to {}'.format(self.pk, self.recipients.replace('\n', ', '))
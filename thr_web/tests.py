@@ -12,6 +12,197 @@
    limitations under the License.
 """
 
-from django.test import TestCase
+import smtplib
+import socket
+import threading
+from io import StringIO
 
-# Create your tests here.
+import pytest
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.utils import timezone
+
+from thr.warmup import warm_up
+from thr_web import admin as thr_admin
+from thr_web.mail import MAX_ATTEMPTS, claim_emails, send_queued_mail
+from thr_web.models import QueuedEmail
+
+
+@pytest.mark.django_db
+def test_warm_up():
+    timings = warm_up()
+    assert set(timings) == {'urls', 'templates', 'rest_framework', 'databases', 'suggest'}
+    assert None not in timings.values()
+
+
+def test_startup_report():
+    out = StringIO()
+    call_command('startup_report', '--top', '3', stdout=out)
+    report = out.getvalue()
+    assert 'thr.wsgi loaded in' in report
+    assert 'app ready' in report
+
+
+def queue_emails(count):
+    connection = mail.get_connection('thr_web.mail.QueuedEmailBackend')
+    messages = [
+        mail.EmailMessage('Subject {}'.format(i), 'Body', 'thr@example.com', ['user{}@example.com'.format(i)])
+        for i in range(count)
+    ]
+    return connection.send_messages(messages)
+
+
+@pytest.mark.django_db
+def test_queued_email(settings):
+    settings.QUEUED_EMAIL_DELIVERY_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    assert queue_emails(3) == 3
+    assert QueuedEmail.objects.count() == 3
+    assert len(mail.outbox) == 0
+
+    assert send_queued_mail(batch_size=2) == (2, 0)
+    assert send_queued_mail(batch_size=2) == (1, 0)
+    assert send_queued_mail(batch_size=2) == (0, 0)
+    assert [message.message()['Subject'] for message in mail.outbox] == ['Subject 0', 'Subject 1', 'Subject 2']
+    assert mail.outbox[0].recipients() == ['user0@example.com']
+    # the content, password reset links included, isn't kept
+    assert set(bytes(message) for message in QueuedEmail.objects.values_list('message', flat=True)) == {b''}
+
+
+@pytest.mark.django_db
+def test_queued_email_retry(settings, caplog):
+    # nothing listens on this port
+    settings.EMAIL_PORT = 9
+    queue_emails(1)
+    # the email stays queued, for later
+    assert send_queued_mail() == (0, 0)
+    queued_email = QueuedEmail.objects.get()
+    assert (queued_email.attempts, queued_email.sent_at) == (0, None)
+    assert queued_email.next_attempt_at > timezone.now()
+
+    QueuedEmail.objects.update(next_attempt_at=None)
+    settings.QUEUED_EMAIL_DELIVERY_BACKEND = 'thr_web.tests.FailingEmailBackend'
+    assert send_queued_mail() == (0, 1)
+    queued_email = QueuedEmail.objects.get()
+    assert queued_email.attempts == 1
+    assert 'refused' in queued_email.last_error
+    # not due before the retry delay
+    assert send_queued_mail() == (0, 0)
+
+    QueuedEmail.objects.update(next_attempt_at=None, attempts=MAX_ATTEMPTS - 1)
+    assert send_queued_mail() == (0, 1)
+    assert bytes(QueuedEmail.objects.get().message) == b''
+    assert any(record.levelname == 'ERROR' and 'given up' in record.message for record in caplog.records)
+    QueuedEmail.objects.update(next_attempt_at=None)
+    assert send_queued_mail() == (0, 0)
+
+
+@pytest.mark.django_db
+def test_queued_email_claimed(settings):
+    settings.QUEUED_EMAIL_DELIVERY_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    queue_emails(3)
+    assert len(claim_emails(2)) == 2
+    # another worker only gets the email left
+    assert send_queued_mail() == (1, 0)
+    assert [message.message()['Subject'] for message in mail.outbox] == ['Subject 2']
+
+
+class FailingEmailBackend(mail.backends.base.BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('Recipient refused')
+
+
+class DisconnectingEmailBackend(LocmemEmailBackend):
+    """
+    Loses the connection when sending the subjects in `drops`, once per item,
+    and can be opened `opens` times
+    """
+    drops = []
+    opens = 10
+    connected = False
+
+    def open(self):
+        if self.connected:
+            return
+        if not self.opens:
+            raise ConnectionRefusedError('Connection refused')
+        DisconnectingEmailBackend.opens -= 1
+        self.connected = True
+
+    def close(self):
+        self.connected = False
+
+    def send_messages(self, email_messages):
+        subject = email_messages[0].message()['Subject']
+        if subject in self.drops:
+            self.drops.remove(subject)
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        return super().send_messages(email_messages)
+
+
+@pytest.mark.django_db
+def test_queued_email_connection_lost(settings, monkeypatch):
+    settings.QUEUED_EMAIL_DELIVERY_BACKEND = 'thr_web.tests.DisconnectingEmailBackend'
+    # the second email is sent over a new connection, the third one is sent again and fails
+    monkeypatch.setattr(DisconnectingEmailBackend, 'drops', ['Subject 1', 'Subject 2', 'Subject 2'])
+    queue_emails(4)
+    assert send_queued_mail() == (3, 1)
+    assert [message.message()['Subject'] for message in mail.outbox] == ['Subject 0', 'Subject 1', 'Subject 3']
+    assert QueuedEmail.objects.get(sent_at__isnull=True).attempts == 1
+
+    # the server is gone: the emails left are retried later, attempts not counted
+    QueuedEmail.objects.all().delete()
+    queue_emails(3)
+    monkeypatch.setattr(DisconnectingEmailBackend, 'drops', ['Subject 1'])
+    monkeypatch.setattr(DisconnectingEmailBackend, 'opens', 1)
+    assert send_queued_mail() == (1, 0)
+    left = QueuedEmail.objects.filter(sent_at__isnull=True)
+    assert [(email.attempts, email.next_attempt_at > timezone.now()) for email in left] == [(0, True), (0, True)]
+
+
+@pytest.mark.django_db
+def test_queued_email_over_smtp(settings):
+    """
+    Deliver the queue to a local SMTP debugging server, over a single connection
+    """
+    smtpd = pytest.importorskip('smtpd')
+    asyncore = pytest.importorskip('asyncore')
+
+    class Server(smtpd.SMTPServer):
+        connections = 0
+        received = []
+
+        def handle_accepted(self, conn, addr):
+            Server.connections += 1
+            super().handle_accepted(conn, addr)
+
+        def process_message(self, peer, mailfrom, rcpttos, data, **kwargs):
+            Server.received.append(rcpttos)
+
+    with socket.socket() as probe:
+        probe.bind(('localhost', 0))
+        port = probe.getsockname()[1]
+    server = Server(('localhost', port), None)
+    thread = threading.Thread(target=asyncore.loop, kwargs={'timeout': 0.1}, daemon=True)
+    thread.start()
+    try:
+        settings.EMAIL_HOST, settings.EMAIL_PORT = 'localhost', port
+        queue_emails(5)
+        assert send_queued_mail() == (5, 0)
+    finally:
+        server.close()
+    assert Server.connections == 1
+    assert sorted(Server.received) == [['user{}@example.com'.format(i)] for i in range(5)]
+
+
+@pytest.mark.django_db
+def test_estimated_count_paginator(monkeypatch, django_user_model):
+    for i in range(3):
+        django_user_model.objects.create_user(username='user{}'.format(i))
+    users = django_user_model.objects.order_by('pk')
+    monkeypatch.setattr(thr_admin, 'estimated_count', lambda model, using: 5000000)
+    assert thr_admin.EstimatedCountPaginator(users, 10).count == 5000000
+    # filtered querysets and small tables are counted exactly
+    assert thr_admin.EstimatedCountPaginator(users.filter(username='user1'), 10).count == 1
+    monkeypatch.setattr(thr_admin, 'estimated_count', lambda model, using: 30)
+    assert thr_admin.EstimatedCountPaginator(users, 10).count == 3
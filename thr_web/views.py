@@ -14,10 +14,17 @@
 
 from django.views.generic import TemplateView
 
+from trackhubs.stats import registry_stats
+
 
 class HomeView(TemplateView):
     template_name = 'home.html'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['stats'] = registry_stats()
+        return context
+
 
 class AboutView(TemplateView):
     template_name = 'about.html'
@@ -0,0 +1,124 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+
+from django.contrib import admin
+from django.db.models import F
+
+from thr_web.admin import LargeTableAdmin
+from .documents import render_hub_document
+from .models import (Assembly, Genome, Hub, HubBatch, HubDocument, HubMonitor, HubStatusBucket, HubVersion, SavedSearch,
+                     Species, Track)
+
+
+@admin.register(Species)
+class SpeciesAdmin(admin.ModelAdmin):
+    list_display = ('scientific_name', 'taxon_id')
+    search_fields = ('^scientific_name',)
+
+
+@admin.register(Assembly)
+class AssemblyAdmin(LargeTableAdmin):
+    list_display = ('name', 'accession', 'species')
+    list_select_related = ('species',)
+    search_fields = ('^name',)
+    autocomplete_fields = ('species',)
+
+
+@admin.register(Hub)
+class HubAdmin(LargeTableAdmin):
+    list_display = ('name', 'short_label', 'url', 'owner', 'is_enabled', 'data_version', 'updated_at')
+    list_filter = ('is_enabled',)
+    list_select_related = ('owner',)
+    search_fields = ('^name', '=url')
+    raw_id_fields = ('owner',)
+    readonly_fields = ('data_version', 'created_at', 'updated_at')
+
+    def save_model(self, request, obj, form, change):
+        changed = change and form.changed_data
+        if changed:
+            obj.data_version = F('data_version') + 1
+        super().save_model(request, obj, form, change)
+        obj.refresh_from_db(fields=['data_version'])
+        if changed:
+            render_hub_document(obj)
+
+
+@admin.register(Genome)
+class GenomeAdmin(LargeTableAdmin):
+    list_display = ('pk', 'hub', 'assembly', 'trackdb_url')
+    list_select_related = ('hub', 'assembly')
+    search_fields = ('^hub__name', '^assembly__name')
+    raw_id_fields = ('hub',)
+    autocomplete_fields = ('assembly',)
+
+
+@admin.register(Track)
+class TrackAdmin(LargeTableAdmin):
+    list_display = ('name', 'short_label', 'file_type', 'hub', 'assembly')
+    list_select_related = ('hub', 'genome__assembly')
+    search_fields = ('^name',)
+    raw_id_fields = ('genome',)
+    readonly_fields = ('hub', 'blob', 'file_type', 'parent', 'visibility', 'short_label', 'track_settings',
+                       'created_at', 'updated_at')
+
+    def assembly(self, track):
+        return track.genome.assembly
+
+    def track_settings(self, track):
+        return json.dumps(track.settings, indent=2)
+
+
+@admin.register(HubDocument)
+class HubDocumentAdmin(LargeTableAdmin):
+    list_display = ('hub', 'data_version')
+    list_select_related = ('hub',)
+    raw_id_fields = ('hub',)
+    exclude = ('body', 'body_gzip')
+
+
+@admin.register(HubMonitor)
+class HubMonitorAdmin(LargeTableAdmin):
+    list_display = ('hub', 'is_up', 'interval', 'consecutive_failures', 'flaps', 'last_checked_at', 'next_check_at')
+    list_select_related = ('hub',)
+    list_filter = ('is_up',)
+    raw_id_fields = ('hub',)
+
+
+@admin.register(HubStatusBucket)
+class HubStatusBucketAdmin(LargeTableAdmin):
+    list_display = ('hub', 'start', 'resolution', 'probes', 'failures')
+    list_select_related = ('hub',)
+    raw_id_fields = ('hub',)
+
+
+@admin.register(SavedSearch)
+class SavedSearchAdmin(LargeTableAdmin):
+    list_display = ('fingerprint', 'query', 'created_at')
+    search_fields = ('=fingerprint',)
+
+
+@admin.register(HubBatch)
+class HubBatchAdmin(LargeTableAdmin):
+    list_display = ('pk', 'owner', 'created_at', 'started_at', 'finished_at')
+    list_select_related = ('owner',)
+    raw_id_fields = ('owner',)
+
+
+@admin.register(HubVersion)
+class HubVersionAdmin(LargeTableAdmin):
+    list_display = ('hub', 'data_version', 'created_at')
+    list_select_related = ('hub',)
+    raw_id_fields = ('hub',)
+    exclude = ('manifest',)
@@ -0,0 +1,25 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from django.urls import path
+
+from .views import SearchView, VirtualHubView, VirtualHubFileView
+
+urlpatterns = [
+    path('', SearchView.as_view(), name='search_api'),
+    path('hub/', VirtualHubView.as_view(), name='virtual_hub_api'),
+    path('hub/<str:fingerprint>/hub.txt', VirtualHubFileView.as_view(), name='virtual_hub_txt'),
+    path('hub/<str:fingerprint>/genomes.txt', VirtualHubFileView.as_view(), name='virtual_genomes_txt'),
+    path('hub/<str:fingerprint>/<str:assembly>/trackDb.txt', VirtualHubFileView.as_view(),
+         name='virtual_trackdb_txt'),
+]
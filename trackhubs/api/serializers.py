@@ -0,0 +1,121 @@
+import json
+
+from rest_framework import serializers
+
+from ..batch import ACTIONS, MAX_OPERATIONS
+from ..models import Assembly, Genome, Hub, HubBatch, Track
+
+
+class TrackSerializer(serializers.ModelSerializer):
+    settings = serializers.DictField(read_only=True)
+
+    class Meta:
+        model = Track
+        fields = ['name', 'settings']
+
+
+class GenomeSerializer(serializers.ModelSerializer):
+    assembly = serializers.CharField(source='assembly.name')
+    tracks = TrackSerializer(many=True)
+
+    class Meta:
+        model = Genome
+        fields = ['assembly', 'trackdb_url', 'tracks']
+
+
+class HubSerializer(serializers.ModelSerializer):
+    owner = serializers.CharField(source='owner.username')
+
+    class Meta:
+        model = Hub
+        fields = ['id', 'url', 'name', 'short_label', 'long_label', 'email', 'owner', 'is_enabled',
+                  'data_version', 'created_at', 'updated_at']
+
+
+class HubDetailSerializer(HubSerializer):
+    genomes = GenomeSerializer(many=True)
+
+    class Meta(HubSerializer.Meta):
+        fields = HubSerializer.Meta.fields + ['genomes']
+
+
+class HubSubmissionSerializer(serializers.Serializer):
+    url = serializers.URLField(max_length=255)
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    action = serializers.ChoiceField(choices=ACTIONS)
+    hub = serializers.IntegerField()
+
+
+class HubBatchSubmissionSerializer(serializers.Serializer):
+    operations = BatchOperationSerializer(many=True, allow_empty=False)
+    background = serializers.BooleanField(default=False)
+
+    def validate_operations(self, operations):
+        if len(operations) > MAX_OPERATIONS:
+            raise serializers.ValidationError('At most {} operations per batch'.format(MAX_OPERATIONS))
+        return operations
+
+
+class HubBatchSerializer(serializers.ModelSerializer):
+    status = serializers.SerializerMethodField()
+    results = serializers.SerializerMethodField()
+
+    class Meta:
+        model = HubBatch
+        fields = ['id', 'status', 'created_at', 'started_at', 'finished_at', 'results', 'error']
+
+    def get_status(self, batch):
+        if batch.finished_at:
+            return 'failed' if batch.error else 'done'
+        return 'running' if batch.started_at else 'queued'
+
+    def get_results(self, batch):
+        return json.loads(batch.results) if batch.results else None
+
+
+class AssemblySerializer(serializers.ModelSerializer):
+    species = serializers.CharField(source='species.scientific_name', default=None)
+    hub_count = serializers.IntegerField()
+
+    class Meta:
+        model = Assembly
+        fields = ['name', 'accession', 'species', 'hub_count']
+
+
+class ProjectionSerializer:
+    """
+    Read-only serializer for long listings. Instead of building model instances
+    and running the DRF field machinery for each row, it fetches only the needed
+    columns with a .values() projection and renames them into plain dicts.
+    Subclasses declare `fields`, a mapping of output name to ORM lookup
+    (which can follow relations, the joins are done by the same query)
+    """
+    fields = {}
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    def __iter__(self):
+        names = list(self.fields)
+        lookups = list(self.fields.values())
+        for row in self.queryset.values_list(*lookups).iterator():
+            yield dict(zip(names, row))
+
+    @property
+    def data(self):
+        return list(self)
+
+
+class TrackProjection(ProjectionSerializer):
+    fields = {
+        'id': 'pk',
+        'name': 'name',
+        'hub': 'hub_id',
+        'assembly': 'genome__assembly__name',
+        'type': 'file_type',
+        'parent': 'parent',
+        'visibility': 'visibility',
+        'short_label': 'short_label',
+    }
@@ -0,0 +1,27 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from django.urls import path
+
+from .views import (AssemblyListView, CacheStatsView, HubBatchDetailView, HubBatchView, HubListView, HubDetailView,
+                    HubTrackListView)
+
+urlpatterns = [
+    path('', HubListView.as_view(), name='hub_list_api'),
+    path('<int:pk>/', HubDetailView.as_view(), name='hub_detail_api'),
+    path('<int:pk>/tracks/', HubTrackListView.as_view(), name='hub_track_list_api'),
+    path('assemblies/', AssemblyListView.as_view(), name='assembly_list_api'),
+    path('batch/', HubBatchView.as_view(), name='hub_batch_api'),
+    path('batch/<int:pk>/', HubBatchDetailView.as_view(), name='hub_batch_detail_api'),
+    path('cache-stats/', CacheStatsView.as_view(), name='cache_stats_api'),
+]
@@ -0,0 +1,336 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+import zlib
+
+from django.conf import settings
+from django.db.models import Count
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework import status, authentication, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..batch import queue_batch, run_operations, runs_in_background, validate_operations
+from ..cache import assembly_cache, cache_stats, hub_list_cache, virtual_hub_cache
+from ..documents import hub_document_body, hub_document_version
+from ..ingest import submit_hub
+from ..models import Assembly, Hub, HubBatch, SavedSearch, Track
+from ..parser import HubParseError
+from ..search import (normalize_query, query_fingerprint, search_tracks, virtual_genomes_txt, virtual_hub_txt,
+                      virtual_trackdb_txt)
+from ..suggest import suggest_index
+from .serializers import (AssemblySerializer, HubBatchSerializer, HubBatchSubmissionSerializer, HubSerializer,
+                          HubSubmissionSerializer, TrackProjection)
+
+
+PAGE_PARAMETERS_ERROR = 'after must be an integer and limit a positive integer'
+
+
+def _page_parameters(request, default_size, max_size):
+    """
+    Parse the keyset pagination parameters of a request
+    :returns: the id to start after and the page size
+    :raises ValueError: if they aren't integers or the page size isn't positive
+    """
+    after = int(request.query_params.get('after', 0))
+    limit = int(request.query_params.get('limit', default_size))
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return after, min(limit, max_size)
+
+
+def _page_response(request, results, limit):
+    """
+    :param results: the serialized page, ordered by id
+    :returns: the Response with the results and the URL of the next page, relative as the
+        proxy cache serves the same response whatever the host (see proxy/default.conf)
+    """
+    next_url = None
+    if len(results) == limit:
+        params = request.GET.copy()
+        params['after'] = results[-1]['id']
+        params['limit'] = limit
+        next_url = '{}?{}'.format(request.path, params.urlencode())
+    return Response({'results': results, 'next': next_url})
+
+
+def _page(request, tracks, limit):
+    """
+    Serialize a page of tracks, ordered by id
+    :returns: the Response with the results and the URL of the next page
+    """
+    return _page_response(request, TrackProjection(tracks[:limit]).data, limit)
+
+
+def _submit(request, url):
+    """
+    Submit or resubmit a hub on behalf of the request user
+    :returns: the Response describing what changed or the error
+    """
+    try:
+        hub, changes = submit_hub(request.user, url)
+    except HubParseError as error:
+        return Response({'error': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+    except PermissionError as error:
+        return Response({'error': str(error)}, status=status.HTTP_403_FORBIDDEN)
+    except OSError as error:
+        return Response({'error': 'Unable to fetch the hub: {}'.format(error)}, status=status.HTTP_400_BAD_REQUEST)
+    data = {'id': hub.pk, 'data_version': hub.data_version}
+    data.update(changes._asdict())
+    return Response(data, status=status.HTTP_200_OK)
+
+
+class HubListView(APIView):
+    """
+    List the registered hubs a page at a time (see HubTrackListView), or submit a new one
+    (authenticated users only). Pages are cached separately, so that no cached value grows
+    with the registry
+    """
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    page_size = 100
+    max_page_size = 1000
+
+    def get(self, request):
+        try:
+            after, limit = _page_parameters(request, self.page_size, self.max_page_size)
+        except ValueError:
+            return Response({'error': PAGE_PARAMETERS_ERROR}, status=status.HTTP_400_BAD_REQUEST)
+
+        def serialize():
+            hubs = Hub.objects.select_related('owner').filter(pk__gt=after).order_by('pk')[:limit]
+            return HubSerializer(hubs, many=True).data
+
+        results = hub_list_cache.get_or_set('page:{}:{}'.format(after, limit), serialize)
+        return _page_response(request, results, limit)
+
+    def post(self, request):
+        serializer = HubSubmissionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return _submit(request, serializer.validated_data['url'])
+
+
+class HubDetailView(APIView):
+    """
+    Get a hub with its genomes and tracks. The owner can also resubmit (PUT)
+    the hub, which refetches it from its URL, or delete it
+    """
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+
+    def get(self, request, pk):
+        """
+        Serve the pre-rendered document of the hub (see documents.py), compressed if the client accepts it.
+        Only the body served is read, none for a conditional request matching the current version
+        """
+        data_version = hub_document_version(pk)
+        if data_version is None:
+            raise Http404
+
+        etag = '"{}-{}"'.format(pk, data_version)
+        if etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+            response = HttpResponseNotModified()
+        else:
+            document = hub_document_body(pk, 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''))
+            if document is None:
+                # deleted meanwhile
+                raise Http404
+            data_version, body, compressed = document
+            etag = '"{}-{}"'.format(pk, data_version)
+            response = HttpResponse(body, content_type='application/json')
+            if compressed:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+    def put(self, request, pk):
+        hub = get_object_or_404(Hub, pk=pk, owner=request.user)
+        return _submit(request, hub.url)
+
+    def delete(self, request, pk):
+        hub = get_object_or_404(Hub, pk=pk, owner=request.user)
+        hub.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class HubBatchView(APIView):
+    """
+    Enable, disable, refresh or delete many hubs of the request user at once (see batch.py).
+    Small batches with few refreshes are run right away and their results returned, the others are
+    run in the background (also on request with `background`), their results are then at the returned URL
+    """
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = HubBatchSubmissionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        operations = [dict(operation) for operation in serializer.validated_data['operations']]
+        errors = validate_operations(request.user, operations)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        if serializer.validated_data['background'] or runs_in_background(operations):
+            batch = queue_batch(request.user, operations)
+            url = request.build_absolute_uri(reverse('hub_batch_detail_api', kwargs={'pk': batch.pk}))
+            return Response({'id': batch.pk, 'url': url}, status=status.HTTP_202_ACCEPTED)
+        return Response({'results': run_operations(request.user, operations)})
+
+
+class HubBatchDetailView(APIView):
+    """
+    Get the status of a batch run in the background and, once done, its results
+    """
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        batch = get_object_or_404(HubBatch, pk=pk, owner=request.user)
+        return Response(HubBatchSerializer(batch).data)
+
+
+class HubTrackListView(APIView):
+    """
+    List the tracks of a hub, a page at a time. Pages are keyed on the track id
+    (`after` parameter) rather than an offset and read in order from the (hub, id) index of
+    Track, so deep pages cost the same as the first one
+    """
+    page_size = 1000
+    max_page_size = 10000
+
+    def get(self, request, pk):
+        try:
+            after, limit = _page_parameters(request, self.page_size, self.max_page_size)
+        except ValueError:
+            return Response({'error': PAGE_PARAMETERS_ERROR}, status=status.HTTP_400_BAD_REQUEST)
+        if not Hub.objects.filter(pk=pk).exists():
+            raise Http404
+        return _page(request, Track.objects.filter(hub_id=pk, pk__gt=after).order_by('pk'), limit)
+
+
+class AssemblyListView(APIView):
+    """
+    List the assemblies with their species and the number of hubs providing data for them
+    """
+
+    def get(self, request):
+        def serialize():
+            assemblies = Assembly.objects.select_related('species').annotate(
+                hub_count=Count('genomes')
+            ).order_by('name')
+            return AssemblySerializer(assemblies, many=True).data
+
+        return Response(assembly_cache.get_or_set('all', serialize))
+
+
+class SearchView(APIView):
+    """
+    Search tracks by label (q), assembly, species, type and hub, a page at a time (see HubTrackListView)
+    """
+    page_size = 100
+    max_page_size = 1000
+
+    def get(self, request):
+        try:
+            after, limit = _page_parameters(request, self.page_size, self.max_page_size)
+        except ValueError:
+            return Response({'error': PAGE_PARAMETERS_ERROR}, status=status.HTTP_400_BAD_REQUEST)
+        query = normalize_query(request.query_params)
+        return _page(request, search_tracks(query).filter(pk__gt=after), limit)
+
+
+class CacheStatsView(APIView):
+    """
+    Hit and miss counts of the namespaces of the two-tier cache (see cache.py), staff only.
+    They are counted by each worker, so this shows those of the worker answering
+    """
+    authentication_classes = [authentication.SessionAuthentication, authentication.TokenAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class SuggestView(APIView):
+    """
+    Suggest species, assemblies and hubs whose name, or a word of it, starts with q
+    """
+
+    def get(self, request):
+        return Response({'suggestions': suggest_index.suggest(request.query_params.get('q', ''))})
+
+
+class VirtualHubView(APIView):
+    """
+    Save a search (same parameters as SearchView) and return the URL of the virtual hub
+    made of its results, which can be loaded in a genome browser
+    """
+
+    def post(self, request):
+        query = normalize_query(request.data)
+        fingerprint = query_fingerprint(query)
+        SavedSearch.objects.get_or_create(fingerprint=fingerprint, defaults={'query': json.dumps(query)})
+        url = reverse('virtual_hub_txt', kwargs={'fingerprint': fingerprint})
+        return Response({'url': request.build_absolute_uri(url)}, status=status.HTTP_201_CREATED)
+
+
+# Compressed virtual hub files larger than this aren't cached (memcached stores items up to 1MB)
+MAX_CACHED_SIZE = 900 * 1024
+
+
+class VirtualHubFileView(APIView):
+    """
+    Serve the hub.txt, genomes.txt and trackDb.txt files of a virtual hub. They are streamed
+    as they are generated and cached until a hub changes, so reloading the same virtual hub
+    doesn't query the database
+    """
+
+    def get(self, request, fingerprint, assembly=None):
+        path = request.path.rsplit('/', 1)[1]
+        cache_name = '{}:{}:{}'.format(fingerprint, assembly or '', path)
+        cached = virtual_hub_cache.get(cache_name)
+        if cached is not None:
+            return HttpResponse(zlib.decompress(cached), content_type='text/plain')
+
+        saved_search = SavedSearch.objects.filter(fingerprint=fingerprint).first()
+        if saved_search is None:
+            raise Http404
+        query = json.loads(saved_search.query)
+        if path == 'hub.txt':
+            chunks = virtual_hub_txt(fingerprint, query, settings.DEFAULT_FROM_EMAIL)
+        elif path == 'genomes.txt':
+            chunks = virtual_genomes_txt(query)
+        else:
+            chunks = virtual_trackdb_txt(query, assembly)
+        # the version the file is generated at, hubs can change while it streams
+        version = virtual_hub_cache.version()
+        return StreamingHttpResponse(self._stream_and_cache(cache_name, version, chunks), content_type='text/plain')
+
+    @staticmethod
+    def _stream_and_cache(cache_name, version, chunks):
+        compressor = zlib.compressobj()
+        compressed = []
+        for chunk in chunks:
+            data = chunk.encode('utf-8')
+            compressed.append(compressor.compress(data))
+            yield data
+        compressed.append(compressor.flush())
+        body = b''.join(compressed)
+        if len(body) <= MAX_CACHED_SIZE:
+            virtual_hub_cache.set(cache_name, body, version)
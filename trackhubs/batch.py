@@ -0,0 +1,242 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import http.client
+import json
+import logging
+import threading
+from datetime import timedelta
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import signals
+from .cache import hub_list_cache, virtual_hub_cache
+from .documents import render_hub_document
+from .ingest import submit_hub
+from .models import Hub, HubBatch
+from .parser import HubParseError
+
+"""
+Operations on many hubs of an owner at once: enable, disable, refresh and delete.
+
+A batch is validated as a whole before anything is applied. Consecutive operations
+with the same action are then applied together, CHUNK_SIZE hubs per transaction, so
+a failure only affects the operations of its chunk. Refreshes fetch the hubs and
+are run one by one, each in its own transaction (see ingest.submit_hub).
+
+Large batches, and those with more than a few refreshes, are stored as a HubBatch
+and run by the run_hub_batches command. The worker running a batch holds a lease on it,
+renewed as the operations are applied: the batch of a worker killed meanwhile is run
+again once the lease expires, up to MAX_BATCH_ATTEMPTS times.
+"""
+
+logger = logging.getLogger(__name__)
+
+ENABLE = 'enable'
+DISABLE = 'disable'
+REFRESH = 'refresh'
+DELETE = 'delete'
+ACTIONS = (ENABLE, DISABLE, REFRESH, DELETE)
+
+MAX_OPERATIONS = 5000
+# larger batches are always run in the background
+MAX_SYNC_OPERATIONS = 100
+# each refresh can wait up to parser.FETCH_TIMEOUT for the remote hub
+MAX_SYNC_REFRESHES = 3
+CHUNK_SIZE = 50
+# time a worker has to apply a chunk or a refresh before its batch can be taken over
+LEASE_TIMEOUT = timedelta(minutes=10)
+MAX_BATCH_ATTEMPTS = 3
+
+
+def validate_operations(owner, operations):
+    """
+    :param owner: the User the batch is run for
+    :param operations: list of {'action', 'hub'} dicts, as checked by HubBatchSubmissionSerializer
+    :returns: a dict of operation index to error, empty if the batch can be run
+    """
+    owned = set(Hub.objects.filter(
+        owner=owner, pk__in={operation['hub'] for operation in operations}
+    ).values_list('pk', flat=True))
+    errors = {}
+    seen = set()
+    for index, operation in enumerate(operations):
+        hub = operation['hub']
+        if hub not in owned:
+            errors[index] = 'No hub {} registered by you'.format(hub)
+        elif hub in seen:
+            errors[index] = 'Hub {} is already in the batch'.format(hub)
+        seen.add(hub)
+    return errors
+
+
+def runs_in_background(operations):
+    """
+    :returns: whether a validated batch is too long to run within a request
+    """
+    refreshes = sum(1 for operation in operations if operation['action'] == REFRESH)
+    return len(operations) > MAX_SYNC_OPERATIONS or refreshes > MAX_SYNC_REFRESHES
+
+
+def _result(index, operation, error=None, **extra):
+    result = {'index': index, 'action': operation['action'], 'hub': operation['hub'],
+              'status': 'error' if error else 'ok'}
+    if error:
+        result['error'] = error
+    result.update(extra)
+    return result
+
+
+def _chunks(operations, chunk_size):
+    """
+    :returns: an iterator of (action, list of (index, operation)), in the order of the operations
+    """
+    for action, group in groupby(enumerate(operations), key=lambda item: item[1]['action']):
+        while True:
+            chunk = list(islice(group, chunk_size))
+            if not chunk:
+                break
+            yield action, chunk
+
+
+def _invalidate(hubs):
+    # update() doesn't send the signals doing this for a single hub, see signals.py
+    transaction.on_commit(hub_list_cache.invalidate)
+    transaction.on_commit(virtual_hub_cache.invalidate)
+    if settings.PROXY_CACHE_REFRESH_URL:
+        paths = sorted({path for hub in hubs for path in signals.hub_paths(hub)})
+        transaction.on_commit(
+            lambda: threading.Thread(target=signals.refresh_proxy_cache, args=(paths,), daemon=True).start()
+        )
+
+
+def _set_enabled(hubs, enabled):
+    changed = [hub for hub in hubs if hub.is_enabled != enabled]
+    if changed:
+        Hub.objects.filter(pk__in=[hub.pk for hub in changed]).update(
+            is_enabled=enabled, data_version=F('data_version') + 1, updated_at=timezone.now()
+        )
+        # here rather than on the next read, which concurrent requests would all do
+        for hub in changed:
+            render_hub_document(hub)
+        _invalidate(changed)
+
+
+def _delete(hubs):
+    for hub in hubs:
+        hub.delete()
+
+
+APPLY = {
+    ENABLE: lambda hubs: _set_enabled(hubs, True),
+    DISABLE: lambda hubs: _set_enabled(hubs, False),
+    DELETE: _delete,
+}
+
+
+def _refresh(owner, index, operation):
+    hub = Hub.objects.filter(pk=operation['hub'], owner=owner).first()
+    if hub is None:
+        return _result(index, operation, 'No hub {} registered by you'.format(operation['hub']))
+    try:
+        hub, changes = submit_hub(owner, hub.url)
+    except (HubParseError, PermissionError) as error:
+        return _result(index, operation, str(error))
+    except (OSError, http.client.HTTPException) as error:
+        return _result(index, operation, 'Unable to fetch the hub: {}'.format(error))
+    return _result(index, operation, data_version=hub.data_version, **changes._asdict())
+
+
+def run_operations(owner, operations, chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Apply a validated batch, see the module docstring
+    :param progress: callable called after each chunk and each refresh
+    :returns: the list of the results, one dict per operation with its index, action, hub
+        and status ('ok' or 'error', in which case error gives the reason)
+    """
+    progress = progress or (lambda: None)
+    results = []
+    for action, chunk in _chunks(operations, chunk_size):
+        if action == REFRESH:
+            for index, operation in chunk:
+                results.append(_refresh(owner, index, operation))
+                progress()
+            continue
+        progress()
+        try:
+            with transaction.atomic():
+                hubs = Hub.objects.select_for_update().filter(
+                    owner=owner, pk__in=[operation['hub'] for _, operation in chunk]
+                )
+                hubs = {hub.pk: hub for hub in hubs}
+                APPLY[action](list(hubs.values()))
+        except DatabaseError as error:
+            logger.exception('Batch %s of hubs %s failed', action, [operation['hub'] for _, operation in chunk])
+            results.extend(_result(index, operation, 'Database error: {}'.format(error)) for index, operation in chunk)
+            continue
+        for index, operation in chunk:
+            if operation['hub'] in hubs:
+                results.append(_result(index, operation))
+            else:
+                # removed since the batch was validated
+                results.append(_result(index, operation, 'No hub {} registered by you'.format(operation['hub'])))
+    return results
+
+
+def queue_batch(owner, operations):
+    """
+    Store a validated batch for the run_hub_batches command
+    :returns: the HubBatch
+    """
+    return HubBatch.objects.create(owner=owner, operations=json.dumps(operations))
+
+
+def _renew_lease(batch):
+    HubBatch.objects.filter(pk=batch.pk).update(lease_expires_at=timezone.now() + LEASE_TIMEOUT)
+
+
+def run_queued_batch():
+    """
+    Run the oldest batch not started yet, or whose worker stopped before finishing it.
+    A batch failing on an unexpected error is finished with the error, and without results
+    :returns: the HubBatch run, None if there was none
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = HubBatch.objects.select_for_update().filter(
+            Q(started_at__isnull=True) | Q(lease_expires_at__lt=now), finished_at__isnull=True,
+        ).order_by('created_at').first()
+        if batch is None:
+            return None
+        batch.started_at = now
+        batch.lease_expires_at = now + LEASE_TIMEOUT
+        batch.attempts += 1
+        batch.save(update_fields=['started_at', 'lease_expires_at', 'attempts'])
+
+    if batch.attempts > MAX_BATCH_ATTEMPTS:
+        logger.error('Batch %s interrupted %s times, given up', batch.pk, MAX_BATCH_ATTEMPTS)
+        batch.error = 'Interrupted {} times'.format(MAX_BATCH_ATTEMPTS)
+    else:
+        try:
+            batch.results = json.dumps(run_operations(batch.owner, json.loads(batch.operations),
+                                                      progress=lambda: _renew_lease(batch)))
+        except Exception as error:
+            logger.exception('Batch %s failed', batch.pk)
+            batch.error = str(error) or type(error).__name__
+    batch.finished_at = timezone.now()
+    batch.save(update_fields=['results', 'error', 'finished_at'])
+    return batch
@@ -0,0 +1,189 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+import zlib
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import ProtectedError
+from django.utils import timezone
+
+from .codec import decode_settings, encode_settings
+from .models import HubVersion, StanzaBlob, Track
+from .parser import stanza_digest
+
+"""
+Content-addressed storage of trackDb stanzas and the version history of the hubs.
+
+The encoded settings of a stanza are stored once as a StanzaBlob keyed by their
+digest (parser.stanza_digest), whichever tracks of whichever hubs have the same
+settings: resubmissions and boilerplate composite or view stanzas shared by hubs
+don't take more room. A HubVersion only keeps the digests of the stanzas of a hub
+version, so keeping every version costs about 20 bytes per track, the size of a
+compressed hex digest.
+
+Blobs are never updated nor deleted when tracks change; collect_garbage() deletes
+those no track nor hub version references any more.
+"""
+
+BATCH_SIZE = 500
+# blobs younger than this are kept, they may belong to an ingestion in progress
+GC_GRACE = timedelta(hours=1)
+
+DIGEST_LENGTH = 40
+
+
+def store_blobs(stanzas):
+    """
+    Store the blobs of stanzas which aren't stored yet
+    :param stanzas: a mapping of digest to stanza
+    :returns: the number of blobs created
+    """
+    digests = list(stanzas)
+    missing = []
+    for start in range(0, len(digests), BATCH_SIZE):
+        batch = digests[start:start + BATCH_SIZE]
+        stored = set(StanzaBlob.objects.filter(digest__in=batch).values_list('digest', flat=True))
+        missing.extend(digest for digest in batch if digest not in stored)
+    # stored concurrently by another ingestion, if there is a conflict
+    StanzaBlob.objects.bulk_create(
+        [StanzaBlob(digest=digest, body=encode_settings(stanzas[digest])) for digest in missing],
+        batch_size=BATCH_SIZE, ignore_conflicts=True,
+    )
+    return len(missing)
+
+
+def unique_stanzas(stanzas):
+    """
+    :returns: the stanzas by track name, the last one winning when a name is repeated, as ingested
+    """
+    return OrderedDict((stanza['track'], stanza) for stanza in stanzas)
+
+
+def encode_manifest(hub_settings, genomes):
+    """
+    :param hub_settings: the hub.txt settings
+    :param genomes: list of dicts with the genome, trackdb_url and list of stanza digests
+    :returns: the compressed manifest of a hub version
+    """
+    manifest = {'hub': hub_settings, 'genomes': [
+        {'genome': genome['genome'], 'trackdb_url': genome['trackdb_url'], 'stanzas': ''.join(genome['stanzas'])}
+        for genome in genomes
+    ]}
+    return zlib.compress(json.dumps(manifest, separators=(',', ':')).encode('utf-8'), 9)
+
+
+def decode_manifest(data):
+    """
+    Decode a manifest encoded with encode_manifest()
+    """
+    manifest = json.loads(zlib.decompress(bytes(data)).decode('utf-8'))
+    for genome in manifest['genomes']:
+        stanzas = genome['stanzas']
+        genome['stanzas'] = [stanzas[start:start + DIGEST_LENGTH] for start in range(0, len(stanzas), DIGEST_LENGTH)]
+    return manifest
+
+
+def record_version(hub, description):
+    """
+    Add the current version of a hub to its history, once its tracks are stored
+    :param hub: the Hub, with its new data_version
+    :param description: the hub as returned by parser.load_hub()
+    :returns: the HubVersion
+    """
+    genomes = [
+        {'genome': genome['genome'], 'trackdb_url': genome['trackdb_url'],
+         'stanzas': [stanza_digest(stanza) for stanza in unique_stanzas(genome['stanzas']).values()]}
+        for genome in description['genomes']
+    ]
+    version, _ = HubVersion.objects.update_or_create(
+        hub=hub, data_version=hub.data_version,
+        defaults={'manifest': encode_manifest(description['hub'], genomes)},
+    )
+    return version
+
+
+def load_version(version):
+    """
+    Rebuild a past version of a hub
+    :param version: the HubVersion
+    :returns: the hub in the format of parser.load_hub()
+    """
+    manifest = decode_manifest(version.manifest)
+    digests = list({digest for genome in manifest['genomes'] for digest in genome['stanzas']})
+    bodies = {}
+    for start in range(0, len(digests), BATCH_SIZE):
+        bodies.update(StanzaBlob.objects.filter(digest__in=digests[start:start + BATCH_SIZE]).values_list(
+            'digest', 'body'))
+    return {'hub': manifest['hub'], 'genomes': [
+        {'genome': genome['genome'], 'trackdb_url': genome['trackdb_url'],
+         'stanzas': [decode_settings(bodies[digest]) for digest in genome['stanzas']]}
+        for genome in manifest['genomes']
+    ]}
+
+
+def _unmark_versions(candidates, versions):
+    # the manifests are decoded one at a time, only the candidates are kept in memory
+    for manifest in versions.values_list('manifest', flat=True).iterator():
+        for genome in decode_manifest(manifest)['genomes']:
+            candidates.difference_update(genome['stanzas'])
+
+
+def _delete_blobs(digests):
+    with transaction.atomic():
+        # tracks stored while marking may reuse old blobs
+        in_use = Track.objects.filter(blob_id__in=digests).values('blob_id')
+        return StanzaBlob.objects.filter(digest__in=digests).exclude(digest__in=in_use).only('digest').delete()[0]
+
+
+def collect_garbage(grace=GC_GRACE, dry_run=False):
+    """
+    Delete the blobs referenced by no track nor hub version (mark and sweep)
+    :param grace: age under which unreferenced blobs are kept
+    :param dry_run: only count the blobs that would be deleted
+    :returns: the number of blobs deleted
+    """
+    started_at = timezone.now()
+    # marked by batches of old blobs, so memory is bounded by the garbage rather than every digest
+    candidates = set()
+    old_blobs = StanzaBlob.objects.filter(created_at__lt=started_at - grace).order_by('digest')
+    last = ''
+    while True:
+        batch = list(old_blobs.filter(digest__gt=last).values_list('digest', flat=True)[:BATCH_SIZE])
+        if not batch:
+            break
+        last = batch[-1]
+        candidates.update(batch)
+        candidates.difference_update(Track.objects.filter(blob_id__in=batch).values_list('blob_id', flat=True))
+    _unmark_versions(candidates, HubVersion.objects.filter(created_at__lt=started_at))
+    # versions recorded while marking may reuse old blobs
+    _unmark_versions(candidates, HubVersion.objects.filter(created_at__gte=started_at))
+    candidates = sorted(candidates)
+    if dry_run:
+        return len(candidates)
+
+    deleted = 0
+    for start in range(0, len(candidates), BATCH_SIZE):
+        batch = candidates[start:start + BATCH_SIZE]
+        try:
+            deleted += _delete_blobs(batch)
+        except (IntegrityError, ProtectedError):
+            # an ingestion not committed yet reuses some of them, which are kept
+            for digest in batch:
+                try:
+                    deleted += _delete_blobs([digest])
+                except (IntegrityError, ProtectedError):
+                    pass
+    return deleted
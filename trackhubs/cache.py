@@ -0,0 +1,269 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+
+"""
+Two-tier object cache for read-mostly registry records.
+
+A small LRU local to the worker process sits in front of the shared Django cache.
+Entries are grouped in namespaces whose version is part of every key, so a whole
+namespace is invalidated at once by bumping its version. The version itself is
+kept in the local tier for LOCAL_TTL seconds, which bounds how long another worker
+can serve data invalidated elsewhere.
+
+When a shared entry goes stale a single worker recomputes it (guarded by a lock
+key in the shared cache) while the others keep serving the stale value, and when
+it is missing altogether the other workers wait for the recomputed value rather
+than all hitting the database at once.
+
+Each namespace counts its hits and misses in the worker, see cache_stats().
+"""
+
+LOCAL_SIZE = 512
+LOCAL_TTL = 5
+TIMEOUT = 300
+# how long stale values remain available for serving while being recomputed
+STALE_GRACE = 60
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+_MISSING = object()
+# the TieredCache instances of the process, for cache_stats()
+_instances = weakref.WeakSet()
+
+
+class LocalLRU:
+    """
+    Thread safe LRU with a time to live, local to the process
+    """
+
+    def __init__(self, size=LOCAL_SIZE, ttl=LOCAL_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class TieredCache:
+    """
+    A namespace of the two-tier cache, see the module docstring
+    :param namespace: the prefix of all the keys of this cache
+    :param timeout: seconds a value stays fresh in the shared cache
+    :param local: the LocalLRU to use, shared by all namespaces by default
+    :param alias: the Django cache to use as shared tier
+    :param local_values: whether values are kept in the local tier too. The LocalLRU is bounded
+        by its number of entries, large values should only be kept in the shared tier
+    """
+
+    def __init__(self, namespace, timeout=TIMEOUT, local=None, alias='default', local_values=True):
+        self.namespace = namespace
+        # local_hits, shared_hits, stale_hits and misses of this worker
+        self.stats = Counter()
+        self.timeout = timeout
+        self.local = local if local is not None else _local
+        self.alias = alias
+        self.local_values = local_values
+        _instances.add(self)
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _version_key(self):
+        return 'thr:{}:version'.format(self.namespace)
+
+    def version(self):
+        version_key = self._version_key()
+        version = self.local.get(version_key)
+        if version is _MISSING:
+            version = self.shared.get(version_key)
+            if version is None:
+                # start from a value that can't collide with the versions of evicted entries
+                self.shared.add(version_key, int(time.time()), None)
+                version = self.shared.get(version_key)
+            self.local.set(version_key, version)
+        return version
+
+    def _local_get(self, key):
+        return self.local.get(key) if self.local_values else _MISSING
+
+    def _local_set(self, key, value):
+        if self.local_values:
+            self.local.set(key, value)
+
+    def make_key(self, name, version=None):
+        return 'thr:{}:{}:{}'.format(self.namespace, self.version() if version is None else version, name)
+
+    def get_or_set(self, name, producer):
+        """
+        Get a value from the cache, computing it with producer() if needed
+        :param name: the key of the value in this namespace
+        :param producer: callable returning the value, called at most once
+        :returns: the cached or computed value
+        """
+        key = self.make_key(name)
+        value = self._local_get(key)
+        if value is not _MISSING:
+            self.stats['local_hits'] += 1
+            return value
+
+        envelope = self.shared.get(key)
+        locked = self._lock(key) if envelope is None or envelope[1] <= time.time() else False
+        if envelope is not None and not locked:
+            value, fresh_until = envelope
+            self.stats['shared_hits' if fresh_until > time.time() else 'stale_hits'] += 1
+            self._local_set(key, value)
+            return value
+        if envelope is None and not locked:
+            envelope = self._wait_for(key)
+            if envelope is not None:
+                self.stats['shared_hits'] += 1
+                self._local_set(key, envelope[0])
+                return envelope[0]
+
+        self.stats['misses'] += 1
+        try:
+            value = producer()
+            self.shared.set(key, (value, time.time() + self.timeout), self.timeout + STALE_GRACE)
+            self._local_set(key, value)
+        finally:
+            if locked:
+                self.shared.delete(key + ':lock')
+        return value
+
+    def get(self, name):
+        """
+        Get a value without computing it when missing, see get_or_set()
+        :returns: the value or None
+        """
+        key = self.make_key(name)
+        value = self._local_get(key)
+        if value is not _MISSING:
+            self.stats['local_hits'] += 1
+            return value
+        envelope = self.shared.get(key)
+        if envelope is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['shared_hits'] += 1
+        self._local_set(key, envelope[0])
+        return envelope[0]
+
+    def set(self, name, value, version=None):
+        """
+        :param version: the version of the namespace the value was computed at, the current one by default.
+            A value computed before an invalidation is then stored under the old version, where it isn't read
+        """
+        key = self.make_key(name, version)
+        self.shared.set(key, (value, time.time() + self.timeout), self.timeout + STALE_GRACE)
+        self._local_set(key, value)
+
+    def _lock(self, key):
+        return self.shared.add(key + ':lock', 1, LOCK_TIMEOUT)
+
+    def _wait_for(self, key):
+        """
+        Wait for another worker to store the value of a key
+        :returns: the stored envelope or None if it didn't come in time
+        """
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            envelope = self.shared.get(key)
+            if envelope is not None:
+                return envelope
+            if self.shared.get(key + ':lock') is None:
+                break
+        return None
+
+    def delete(self, name):
+        """
+        Invalidate a single value
+        """
+        key = self.make_key(name)
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def invalidate(self):
+        """
+        Invalidate every value of the namespace by bumping its version
+        """
+        version_key = self._version_key()
+        try:
+            version = self.shared.incr(version_key)
+        except ValueError:
+            # the version was evicted
+            version = int(time.time())
+            self.shared.set(version_key, version, None)
+        self.local.set(version_key, version)
+
+
+def cache_stats():
+    """
+    :returns: a dict of namespace to the hit and miss counts of this worker, and the hit rate
+        (None before the first lookup)
+    """
+    counts = {}
+    for instance in list(_instances):
+        counts.setdefault(instance.namespace, Counter()).update(instance.stats)
+    stats = {}
+    for namespace, counter in sorted(counts.items()):
+        hits = counter['local_hits'] + counter['shared_hits'] + counter['stale_hits']
+        lookups = hits + counter['misses']
+        stats[namespace] = {
+            'local_hits': counter['local_hits'], 'shared_hits': counter['shared_hits'],
+            'stale_hits': counter['stale_hits'], 'misses': counter['misses'],
+            'hit_rate': hits / lookups if lookups else None,
+        }
+    return stats
+
+
+_local = LocalLRU()
+
+hub_list_cache = TieredCache('hub-list')
+assembly_cache = TieredCache('assembly')
+# files of up to api.views.MAX_CACHED_SIZE
+virtual_hub_cache = TieredCache('virtual-hub', timeout=3600, local_values=False)
@@ -0,0 +1,91 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+import zlib
+from collections import OrderedDict
+
+"""
+Compact binary encoding of trackDb stanza settings.
+
+Settings names that appear in most stanzas are replaced by their index in
+COMMON_SETTINGS, the resulting list of pairs is serialised as compact JSON
+and compressed when that makes it smaller. The first byte of the blob tells
+which form is used, so the format can evolve without a data migration.
+
+COMMON_SETTINGS is part of the storage format: only ever append to it.
+"""
+
+COMMON_SETTINGS = (
+    'track', 'type', 'shortLabel', 'longLabel', 'bigDataUrl', 'parent',
+    'visibility', 'color', 'priority', 'autoScale', 'maxHeightPixels',
+    'viewLimits', 'compositeTrack', 'subGroup1', 'subGroup2', 'subGroup3',
+    'subGroups', 'dimensions', 'sortOrder', 'view', 'superTrack', 'container',
+    'html', 'bigDataIndex', 'searchIndex', 'windowingFunction', 'graphTypeDefault',
+    'altColor', 'itemRgb', 'group', 'metadata', 'spectrum', 'smoothingWindow',
+    'dragAndDrop', 'allButtonPair', 'centerLabelsDense', 'visibilityViewDefaults',
+    'aggregate', 'showSubtrackColorOnUi', 'transformFunc', 'yLineOnOff',
+    'labelFields', 'defaultLabelFields', 'url', 'urlLabel', 'descriptionUrl',
+)
+
+_SETTING_CODES = {name: code for code, name in enumerate(COMMON_SETTINGS)}
+
+_RAW = b'j'
+_COMPRESSED = b'z'
+
+
+def encode_settings(stanza):
+    """
+    Encode the settings of a stanza
+    :param stanza: the mapping of setting name to value
+    :returns: the encoded bytes
+    """
+    pairs = [[_SETTING_CODES.get(key, key), value] for key, value in stanza.items()]
+    raw = json.dumps(pairs, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    compressed = zlib.compress(raw, 6)
+    if len(compressed) < len(raw):
+        return _COMPRESSED + compressed
+    return _RAW + raw
+
+
+def decode_settings(blob):
+    """
+    Decode settings encoded with encode_settings()
+    :param blob: the encoded bytes (or memoryview, as returned by some DB drivers)
+    :returns: an OrderedDict of setting name to value, in the original order
+    """
+    blob = bytes(blob)
+    kind, payload = blob[:1], blob[1:]
+    if kind == _COMPRESSED:
+        payload = zlib.decompress(payload)
+    elif kind != _RAW:
+        raise ValueError('Unknown settings encoding {!r}'.format(kind))
+    return OrderedDict(
+        (COMMON_SETTINGS[key] if isinstance(key, int) else key, value)
+        for key, value in json.loads(payload.decode('utf-8'))
+    )
+
+
+def promoted_settings(stanza):
+    """
+    Extract the settings stored in their own indexed columns, so they can be
+    filtered on without decoding the blob
+    :param stanza: the mapping of setting name to value
+    :returns: a dict of Track field name to value
+    """
+    return {
+        'file_type': stanza.get('type', '').split(' ', 1)[0][:50],
+        'parent': stanza.get('parent', '').split(' ', 1)[0][:255],
+        'visibility': stanza.get('visibility', '')[:20],
+        'short_label': stanza.get('shortLabel', '')[:255],
+    }
@@ -0,0 +1,80 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import gzip
+
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from .models import Hub, HubDocument, Track
+
+# Documents smaller than this are not worth storing compressed
+GZIP_MIN_SIZE = 1024
+
+
+def render_hub_document(hub):
+    """
+    Render and store the detail document of the current version of a hub
+    :param hub: the Hub
+    :returns: the saved HubDocument
+    """
+    # imported here as the API serializers depend on the models
+    from .api.serializers import HubDetailSerializer
+
+    hub = Hub.objects.select_related('owner').prefetch_related(
+        'genomes__assembly',
+        Prefetch('genomes__tracks', queryset=Track.objects.select_related('blob').order_by('pk')),
+    ).get(pk=hub.pk)
+    body = JSONRenderer().render(HubDetailSerializer(hub).data)
+    body_gzip = gzip.compress(body, 6) if len(body) >= GZIP_MIN_SIZE else b''
+    document, _ = HubDocument.objects.update_or_create(
+        hub=hub, defaults={'data_version': hub.data_version, 'body': body, 'body_gzip': body_gzip}
+    )
+    return document
+
+
+def hub_document_version(pk):
+    """
+    Get the version of the detail document of a hub, without reading the document.
+    The changes to a hub render its document again (see ingest.py, batch.py and admin.py),
+    it is only rendered here if it's missing or out of date anyway
+    :param pk: the hub id
+    :returns: the data_version of the document, or None if there is no such hub
+    """
+    row = HubDocument.objects.filter(hub_id=pk).values_list('hub__data_version', 'data_version').first()
+    if row is not None and row[0] == row[1]:
+        return row[1]
+    hub = Hub.objects.filter(pk=pk).first()
+    if hub is None:
+        return None
+    return render_hub_document(hub).data_version
+
+
+def hub_document_body(pk, accept_gzip):
+    """
+    Read a single body of the detail document of a hub: the compressed one if the client
+    accepts it, unless the document is too small to be stored compressed
+    :param pk: the hub id
+    :param accept_gzip: whether the client accepts gzip
+    :returns: the data_version of the document, the body and whether it is compressed,
+        or None if there is no document
+    """
+    documents = HubDocument.objects.filter(hub_id=pk)
+    if accept_gzip:
+        row = documents.values_list('data_version', 'body_gzip').first()
+        if row is None:
+            return None
+        if row[1]:
+            return row[0], bytes(row[1]), True
+    row = documents.values_list('data_version', 'body').first()
+    return None if row is None else (row[0], bytes(row[1]), False)
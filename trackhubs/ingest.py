@@ -0,0 +1,174 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from collections import Counter, namedtuple
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import parser
+from .blobs import record_version, store_blobs, unique_stanzas
+from .codec import promoted_settings
+from .documents import render_hub_document
+from .models import Assembly, Genome, Hub, Species, Track
+from .stats import (FILE_TYPE, TOTAL, apply_deltas, assembly_species_deltas, genome_deltas, hub_species,
+                    species_deltas)
+
+# Maximum number of rows touched by a single INSERT/UPDATE/DELETE statement
+BATCH_SIZE = 500
+
+TrackChanges = namedtuple('TrackChanges', ['added', 'updated', 'removed', 'unchanged'])
+
+
+def sync_tracks(genome, stanzas, stats=None):
+    """
+    Bring the stored tracks of a genome in line with freshly parsed trackDb stanzas.
+    Stanzas are matched to the stored tracks by their key (the `track` setting)
+    and compared by the digest of their settings, so only new, modified and removed tracks
+    are written, the rest of the table isn't touched. Settings are stored as shared blobs,
+    only the ones not stored yet are written (see blobs.py)
+    :param genome: the Genome the stanzas belong to
+    :param stanzas: the parsed trackDb stanzas
+    :param stats: optional Counter the changes to the registry statistics are added to
+    :returns: a TrackChanges with the number of added, updated, removed and unchanged tracks
+    """
+    incoming = unique_stanzas(stanzas)
+    stored = {
+        name: (pk, digest, file_type)
+        for pk, name, digest, file_type in genome.tracks.values_list('pk', 'name', 'blob_id', 'file_type')
+    }
+
+    to_create = []
+    to_update = []
+    blobs = {}
+    unchanged = 0
+    for name, stanza in incoming.items():
+        digest = parser.stanza_digest(stanza)
+        if name not in stored:
+            to_create.append(Track(genome=genome, hub_id=genome.hub_id, name=name, blob_id=digest, **promoted_settings(stanza)))
+        elif stored[name][1] != digest:
+            to_update.append(Track(pk=stored[name][0], genome=genome, hub_id=genome.hub_id, name=name, blob_id=digest,
+                                   **promoted_settings(stanza)))
+        else:
+            unchanged += 1
+            continue
+        blobs[digest] = stanza
+    to_delete = [pk for name, (pk, _, _) in stored.items() if name not in incoming]
+
+    if stats is not None:
+        for track in to_create:
+            stats[(TOTAL, 'tracks')] += 1
+            stats[(FILE_TYPE, track.file_type)] += 1
+        for track in to_update:
+            stats[(FILE_TYPE, stored[track.name][2])] -= 1
+            stats[(FILE_TYPE, track.file_type)] += 1
+        for name, (_, _, file_type) in stored.items():
+            if name not in incoming:
+                stats[(TOTAL, 'tracks')] -= 1
+                stats[(FILE_TYPE, file_type)] -= 1
+
+    store_blobs(blobs)
+    Track.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    # bulk_update() bypasses auto_now, refresh the timestamp explicitly
+    now = timezone.now()
+    for track in to_update:
+        track.updated_at = now
+    Track.objects.bulk_update(to_update, ['updated_at'] + Track.SETTINGS_FIELDS, batch_size=BATCH_SIZE)
+    for start in range(0, len(to_delete), BATCH_SIZE):
+        Track.objects.filter(pk__in=to_delete[start:start + BATCH_SIZE]).delete()
+
+    return TrackChanges(len(to_create), len(to_update), len(to_delete), unchanged)
+
+
+def set_species(assembly, scientific_name, hub, stats):
+    """
+    Record the species of an assembly which has none, as declared by the scientificName
+    of a genomes.txt stanza
+    :param stats: the Counter of the changes to the statistics, updated for the other hubs of the assembly
+    """
+    if assembly.species_id is not None or not scientific_name:
+        return
+    species, _ = Species.objects.get_or_create(scientific_name=scientific_name[:255])
+    stats.update(assembly_species_deltas(assembly, species, hub))
+    assembly.species = species
+    assembly.save(update_fields=['species'])
+
+
+def submit_hub(owner, url):
+    """
+    Register a hub or apply a resubmission of an already registered one.
+    Only the differences with what is stored are written, see sync_tracks()
+    :param owner: the User submitting the hub
+    :param url: the URL of the hub.txt
+    :returns: the Hub and the TrackChanges summed over all its genomes
+    :raises HubParseError: if the hub can't be parsed
+    :raises PermissionError: if the hub is already registered by someone else
+    """
+    description = parser.load_hub(url)
+    hub_settings = description['hub']
+
+    with transaction.atomic():
+        hub, created = Hub.objects.select_for_update().get_or_create(url=url, defaults={'owner': owner})
+        if not created and hub.owner_id != owner.pk:
+            raise PermissionError('This hub is registered by another user')
+
+        changed = created
+        stats = Counter({(TOTAL, 'hubs'): 1 if created else 0})
+        species = set() if created else hub_species(hub)
+        for field, key in (('name', 'hub'), ('short_label', 'shortLabel'),
+                           ('long_label', 'longLabel'), ('email', 'email')):
+            value = hub_settings.get(key, '')
+            if getattr(hub, field) != value:
+                setattr(hub, field, value)
+                changed = True
+
+        genomes = {genome.assembly.name: genome for genome in hub.genomes.select_related('assembly')}
+        totals = [0, 0, 0, 0]
+        seen = set()
+        for genome_description in description['genomes']:
+            assembly_name = genome_description['genome']
+            seen.add(assembly_name)
+            genome = genomes.get(assembly_name)
+            if genome is None:
+                assembly, _ = Assembly.objects.get_or_create(name=assembly_name)
+                set_species(assembly, genome_description['scientific_name'], hub, stats)
+                genome = Genome.objects.create(hub=hub, assembly=assembly,
+                                               trackdb_url=genome_description['trackdb_url'])
+                stats.update(genome_deltas(Genome.objects.filter(pk=genome.pk)))
+                changed = True
+            else:
+                set_species(genome.assembly, genome_description['scientific_name'], hub, stats)
+                if genome.trackdb_url != genome_description['trackdb_url']:
+                    genome.trackdb_url = genome_description['trackdb_url']
+                    genome.save(update_fields=['trackdb_url'])
+                    changed = True
+            changes = sync_tracks(genome, genome_description['stanzas'], stats)
+            totals = [total + count for total, count in zip(totals, changes)]
+
+        for assembly_name, genome in genomes.items():
+            if assembly_name not in seen:
+                totals[2] += genome.tracks.count()
+                stats.update(genome_deltas(Genome.objects.filter(pk=genome.pk), -1))
+                genome.delete()
+                changed = True
+
+        stats.update(species_deltas(species, hub_species(hub)))
+        changes = TrackChanges(*totals)
+        if changed or changes.added or changes.updated or changes.removed:
+            hub.data_version += 1
+            hub.save()
+            record_version(hub, description)
+            render_hub_document(hub)
+        apply_deltas(stats)
+
+    return hub, changes
@@ -0,0 +1,77 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from trackhubs.query_plans import check_plans, compare, load_baseline, save_baseline, seed
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Explain the hot queries on a seeded test database and compare their plans '
+            'with the accepted ones, see trackhubs/query_plans.py')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--update-baseline', action='store_true', help='accept the current plans')
+        parser.add_argument('--current-database', action='store_true',
+                            help='seed the configured database, in a transaction rolled back at the end, '
+                                 'instead of creating a test database (not on MySQL)')
+        parser.add_argument('--verbose-plans', action='store_true', help='print the plan of every query')
+
+    def handle(self, *args, **options):
+        if options['current_database']:
+            if connection.vendor == 'mysql':
+                # ANALYZE TABLE commits, the seeded rows couldn't be rolled back
+                raise CommandError('--current-database is not supported on MySQL')
+            try:
+                with transaction.atomic():
+                    self.run_check(options)
+                    raise Rollback
+            except Rollback:
+                pass
+            return
+
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.run_check(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_check(self, options):
+        plans = check_plans(seed())
+        if options['verbose_plans']:
+            for name, current in plans.items():
+                self.stdout.write('{}:\n    {}'.format(name, '\n    '.join(current['plan'])))
+
+        if options['update_baseline']:
+            save_baseline(plans)
+            self.stdout.write('Baseline of {} updated'.format(connection.vendor))
+            return
+        baseline = load_baseline()
+        if baseline is None:
+            raise CommandError('No baseline for {}, run with --update-baseline to record one. Flags:\n{}'.format(
+                connection.vendor, '\n'.join('{}: {}'.format(name, flag)
+                                             for name, current in plans.items() for flag in current['flags'])))
+
+        regressions, changes = compare(plans, baseline)
+        for name, change in changes:
+            self.stdout.write('{} plan changed: {}'.format(name, change))
+        if regressions:
+            raise CommandError('Query plan regressions:\n' + '\n'.join(
+                '{}: {}'.format(name, flag) for name, flag in regressions))
+        self.stdout.write('{} query plans checked, no regression'.format(len(plans)))
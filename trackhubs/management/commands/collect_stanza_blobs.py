@@ -0,0 +1,31 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from trackhubs.blobs import GC_GRACE, collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete the stanza blobs no track nor hub version references any more, see trackhubs/blobs.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=float, default=GC_GRACE.total_seconds() / 3600,
+                            help='hours during which new blobs are kept even if unreferenced')
+        parser.add_argument('--dry-run', action='store_true', help='only count the blobs to delete')
+
+    def handle(self, *args, **options):
+        count = collect_garbage(timedelta(hours=options['grace']), options['dry_run'])
+        self.stdout.write('{} unreferenced blobs {}'.format(count, 'found' if options['dry_run'] else 'deleted'))
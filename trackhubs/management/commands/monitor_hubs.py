@@ -0,0 +1,45 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from trackhubs.models import HubMonitor
+from trackhubs.monitor import compact_history, run_checks
+
+# longest sleep between two runs in daemon mode, so new hubs are picked up
+MAX_SLEEP = 60
+
+
+class Command(BaseCommand):
+    help = 'Check the availability of the hubs that are due, see trackhubs/monitor.py'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='maximum number of hubs checked per run')
+        parser.add_argument('--daemon', action='store_true', help='keep running, sleeping until the next check')
+
+    def handle(self, *args, **options):
+        while True:
+            checked = run_checks(options['batch_size'])
+            merged = compact_history()
+            if checked or merged:
+                self.stdout.write('{} hubs checked, {} hourly buckets merged'.format(checked, merged))
+            if not options['daemon']:
+                break
+            if checked < options['batch_size']:
+                next_check = HubMonitor.objects.order_by('next_check_at').values_list(
+                    'next_check_at', flat=True).first()
+                delay = MAX_SLEEP if next_check is None else (next_check - timezone.now()).total_seconds()
+                time.sleep(min(max(delay, 1), MAX_SLEEP))
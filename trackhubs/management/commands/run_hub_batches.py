@@ -0,0 +1,39 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from trackhubs.batch import run_queued_batch
+
+
+class Command(BaseCommand):
+    help = 'Run the hub batches queued by the batch API, oldest first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='keep running, polling the queue')
+        parser.add_argument('--interval', type=float, default=5, help='seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            batch = run_queued_batch()
+            if batch is not None:
+                if batch.error:
+                    self.stderr.write('Batch {} failed: {}'.format(batch.pk, batch.error))
+                else:
+                    self.stdout.write('Batch {} done'.format(batch.pk))
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,86 @@
+# Generated by Django 2.2.13 on 2026-10-19 08:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assembly',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('accession', models.CharField(blank=True, max_length=255, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'assemblies',
+            },
+        ),
+        migrations.CreateModel(
+            name='Species',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scientific_name', models.CharField(max_length=255, unique=True)),
+                ('taxon_id', models.PositiveIntegerField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'species',
+            },
+        ),
+        migrations.CreateModel(
+            name='Hub',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=255, unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('short_label', models.CharField(max_length=255)),
+                ('long_label', models.TextField(blank=True)),
+                ('email', models.CharField(blank=True, max_length=255)),
+                ('data_version', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hubs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Genome',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trackdb_url', models.URLField(max_length=255)),
+                ('assembly', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='genomes', to='trackhubs.Assembly')),
+                ('hub', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='genomes', to='trackhubs.Hub')),
+            ],
+            options={
+                'unique_together': {('hub', 'assembly')},
+            },
+        ),
+        migrations.AddField(
+            model_name='assembly',
+            name='species',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='trackhubs.Species'),
+        ),
+        migrations.CreateModel(
+            name='Track',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('content_hash', models.CharField(max_length=40)),
+                ('settings', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('genome', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tracks', to='trackhubs.Genome')),
+            ],
+            options={
+                'unique_together': {('genome', 'name')},
+            },
+        ),
+    ]
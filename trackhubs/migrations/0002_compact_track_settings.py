@@ -0,0 +1,119 @@
+# Generated by Django 2.2.13 on 2026-10-19 08:27
+
+import json
+import zlib
+from collections import OrderedDict
+
+from django.db import migrations, models
+
+# The encoding of trackhubs.codec when this migration was written, copied so that later
+# changes to the module don't change what the migration does
+
+COMMON_SETTINGS = (
+    'track', 'type', 'shortLabel', 'longLabel', 'bigDataUrl', 'parent',
+    'visibility', 'color', 'priority', 'autoScale', 'maxHeightPixels',
+    'viewLimits', 'compositeTrack', 'subGroup1', 'subGroup2', 'subGroup3',
+    'subGroups', 'dimensions', 'sortOrder', 'view', 'superTrack', 'container',
+    'html', 'bigDataIndex', 'searchIndex', 'windowingFunction', 'graphTypeDefault',
+    'altColor', 'itemRgb', 'group', 'metadata', 'spectrum', 'smoothingWindow',
+    'dragAndDrop', 'allButtonPair', 'centerLabelsDense', 'visibilityViewDefaults',
+    'aggregate', 'showSubtrackColorOnUi', 'transformFunc', 'yLineOnOff',
+    'labelFields', 'defaultLabelFields', 'url', 'urlLabel', 'descriptionUrl',
+)
+
+_SETTING_CODES = {name: code for code, name in enumerate(COMMON_SETTINGS)}
+
+
+def encode_settings(stanza):
+    pairs = [[_SETTING_CODES.get(key, key), value] for key, value in stanza.items()]
+    raw = json.dumps(pairs, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    compressed = zlib.compress(raw, 6)
+    if len(compressed) < len(raw):
+        return b'z' + compressed
+    return b'j' + raw
+
+
+def decode_settings(blob):
+    blob = bytes(blob)
+    kind, payload = blob[:1], blob[1:]
+    if kind == b'z':
+        payload = zlib.decompress(payload)
+    elif kind != b'j':
+        raise ValueError('Unknown settings encoding {!r}'.format(kind))
+    return OrderedDict(
+        (COMMON_SETTINGS[key] if isinstance(key, int) else key, value)
+        for key, value in json.loads(payload.decode('utf-8'))
+    )
+
+
+def promoted_settings(stanza):
+    return {
+        'file_type': stanza.get('type', '').split(' ', 1)[0][:50],
+        'parent': stanza.get('parent', '').split(' ', 1)[0][:255],
+        'visibility': stanza.get('visibility', '')[:20],
+        'short_label': stanza.get('shortLabel', '')[:255],
+    }
+
+
+def encode_track_settings(apps, schema_editor):
+    Track = apps.get_model('trackhubs', 'Track')
+    for track in Track.objects.only('pk', 'settings').iterator():
+        stanza = json.loads(track.settings, object_pairs_hook=OrderedDict)
+        Track.objects.filter(pk=track.pk).update(settings_blob=encode_settings(stanza), **promoted_settings(stanza))
+
+
+def decode_track_settings(apps, schema_editor):
+    Track = apps.get_model('trackhubs', 'Track')
+    for track in Track.objects.only('pk', 'settings_blob').iterator():
+        Track.objects.filter(pk=track.pk).update(settings=json.dumps(decode_settings(track.settings_blob)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackhubs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='file_type',
+            field=models.CharField(blank=True, db_index=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='parent',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='settings_blob',
+            field=models.BinaryField(default=b''),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='short_label',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='visibility',
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.RunPython(encode_track_settings, decode_track_settings),
+        # a default lets the column be re-added if the migration is reversed
+        migrations.AlterField(
+            model_name='track',
+            name='settings',
+            field=models.TextField(default='{}'),
+        ),
+        migrations.RemoveField(
+            model_name='track',
+            name='settings',
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['genome', 'parent'], name='trackhubs_t_genome__6820ed_idx'),
+        ),
+    ]
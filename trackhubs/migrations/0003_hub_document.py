@@ -0,0 +1,23 @@
+# Generated by Django 2.2.13 on 2026-10-19 08:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackhubs', '0002_compact_track_settings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HubDocument',
+            fields=[
+                ('hub', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='document', serialize=False, to='trackhubs.Hub')),
+                ('data_version', models.PositiveIntegerField()),
+                ('body', models.BinaryField()),
+                ('body_gzip', models.BinaryField(blank=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 2.2.13 on 2026-10-19 08:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackhubs', '0004_saved_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HubMonitor',
+            fields=[
+                ('hub', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='monitor', serialize=False, to='trackhubs.Hub')),
+                ('next_check_at', models.DateTimeField(db_index=True)),
+                ('interval', models.PositiveIntegerField()),
+                ('is_up', models.NullBooleanField()),
+                ('consecutive_failures', models.PositiveIntegerField(default=0)),
+                ('flaps', models.PositiveSmallIntegerField(default=0)),
+                ('last_checked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.CharField(blank=True, max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HubStatusBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('resolution', models.PositiveIntegerField()),
+                ('probes', models.PositiveIntegerField(default=0)),
+                ('failures', models.PositiveIntegerField(default=0)),
+                ('total_latency_ms', models.PositiveIntegerField(default=0)),
+                ('hub', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='status_buckets', to='trackhubs.Hub')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='hubstatusbucket',
+            index=models.Index(fields=['resolution', 'start'], name='trackhubs_h_resolut_36eebf_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='hubstatusbucket',
+            unique_together={('hub', 'resolution', 'start')},
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.13 on 2026-10-19 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackhubs', '0005_hub_monitor'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='hub',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='track',
+            name='name',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+    ]
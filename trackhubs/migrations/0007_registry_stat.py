@@ -0,0 +1,30 @@
+# Generated by Django 2.2.13 on 2026-10-19 08:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackhubs', '0006_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistryStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('facet', models.CharField(max_length=32)),
+                ('value', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='registrystat',
+            index=models.Index(fields=['facet', 'count'], name='trackhubs_r_facet_2c47a3_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='registrystat',
+            unique_together={('facet', 'value')},
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 2.2.13 on 2026-10-19 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('trackhubs', '0007_registry_stat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hub',
+            name='is_enabled',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='HubBatch',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operations', models.TextField()),
+                ('results', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hub_batches', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='hubbatch',
+            index=models.Index(fields=['started_at', 'created_at'], name='trackhubs_h_started_5a9dc0_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.13 on 2026-10-19 08:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackhubs', '0008_hub_batch'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hub',
+            index=models.Index(fields=['owner', 'updated_at'], name='trackhubs_h_owner_i_b0619c_idx'),
+        ),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 2.2.13 on 2026-10-19 09:12
+
+import json
+import zlib
+
+from django.db import migrations, models
+from django.db.models import F
+import django.db.models.deletion
+
+# Copied from trackhubs.blobs when this migration was written, so that later
+# changes to the module don't change what the migration does
+BATCH_SIZE = 500
+
+
+def encode_manifest(hub_settings, genomes):
+    manifest = {'hub': hub_settings, 'genomes': [
+        {'genome': genome['genome'], 'trackdb_url': genome['trackdb_url'], 'stanzas': ''.join(genome['stanzas'])}
+        for genome in genomes
+    ]}
+    return zlib.compress(json.dumps(manifest, separators=(',', ':')).encode('utf-8'), 9)
+
+
+def store_track_blobs(apps, schema_editor):
+    StanzaBlob = apps.get_model('trackhubs', 'StanzaBlob')
+    Track = apps.get_model('trackhubs', 'Track')
+    seen = set()
+    blobs = []
+    for digest, body in Track.objects.values_list('content_hash', 'settings_blob').iterator():
+        if digest in seen:
+            continue
+        seen.add(digest)
+        blobs.append(StanzaBlob(digest=digest, body=body))
+        if len(blobs) == BATCH_SIZE:
+            StanzaBlob.objects.bulk_create(blobs)
+            blobs = []
+    StanzaBlob.objects.bulk_create(blobs)
+    Track.objects.update(blob_id=F('content_hash'))
+
+    # the current version of each hub starts its history
+    Genome = apps.get_model('trackhubs', 'Genome')
+    Hub = apps.get_model('trackhubs', 'Hub')
+    HubVersion = apps.get_model('trackhubs', 'HubVersion')
+    for hub in Hub.objects.iterator():
+        hub_settings = {'hub': hub.name, 'shortLabel': hub.short_label, 'longLabel': hub.long_label,
+                        'email': hub.email}
+        genomes = [
+            {'genome': genome.assembly.name, 'trackdb_url': genome.trackdb_url,
+             'stanzas': list(Track.objects.filter(genome=genome).order_by('pk').values_list('blob_id', flat=True))}
+            for genome in Genome.objects.filter(hub=hub).select_related('assembly').order_by('pk')
+        ]
+        HubVersion.objects.create(hub=hub, data_version=hub.data_version,
+                                  manifest=encode_manifest(hub_settings, genomes))
+
+
+def copy_track_blobs(apps, schema_editor):
+    Track = apps.get_model('trackhubs', 'Track')
+    Track.objects.update(content_hash=F('blob_id'))
+    for pk, body in Track.objects.values_list('pk', 'blob__body').iterator():
+        Track.objects.filter(pk=pk).update(settings_blob=body)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackhubs', '0009_query_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StanzaBlob',
+            fields=[
+                ('digest', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('body', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HubVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_version', models.PositiveIntegerField()),
+                ('manifest', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('hub', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='trackhubs.Hub')),
+            ],
+            options={
+                'unique_together': {('hub', 'data_version')},
+            },
+        ),
+        migrations.AddField(
+            model_name='track',
+            name='blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='tracks', to='trackhubs.StanzaBlob'),
+        ),
+        migrations.RunPython(store_track_blobs, copy_track_blobs),
+        # defaults let the columns be re-added if the migration is reversed
+        migrations.AlterField(
+            model_name='track',
+            name='content_hash',
+            field=models.CharField(default='', max_length=40),
+        ),
+        migrations.AlterField(
+            model_name='track',
+            name='settings_blob',
+            field=models.BinaryField(default=b''),
+        ),
+        migrations.RemoveField(
+            model_name='track',
+            name='content_hash',
+        ),
+        migrations.RemoveField(
+            model_name='track',
+            name='settings_blob',
+        ),
+        migrations.AlterField(
+            model_name='track',
+            name='blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='tracks', to='trackhubs.StanzaBlob'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-19 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackhubs', '0010_stanza_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hubbatch',
+            name='error',
+            field=models.TextField(blank=True),
+        ),
+    ]
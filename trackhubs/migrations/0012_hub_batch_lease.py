@@ -0,0 +1,23 @@
+# Generated by Django 2.2.13 on 2026-10-19 09:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackhubs', '0011_hub_batch_error'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hubbatch',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='hubbatch',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.13 on 2026-10-19 09:41
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def copy_genome_hubs(apps, schema_editor):
+    Genome = apps.get_model('trackhubs', 'Genome')
+    Track = apps.get_model('trackhubs', 'Track')
+    Track.objects.update(hub_id=Subquery(Genome.objects.filter(pk=OuterRef('genome_id')).values('hub_id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackhubs', '0012_hub_batch_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='track',
+            name='hub',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tracks', to='trackhubs.Hub'),
+        ),
+        migrations.RunPython(copy_genome_hubs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='track',
+            name='hub',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='tracks', to='trackhubs.Hub'),
+        ),
+        migrations.AddIndex(
+            model_name='track',
+            index=models.Index(fields=['hub', 'id'], name='trackhubs_t_hub_id_450ab2_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.13 on 2026-10-19 09:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackhubs', '0013_track_hub'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hub',
+            index=models.Index(fields=['is_enabled'], name='trackhubs_h_is_enab_d660cf_idx'),
+        ),
+    ]
@@ -0,0 +1,284 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from django.contrib.auth.models import User
+from django.db import models
+
+from .codec import decode_settings, encode_settings, promoted_settings
+from .parser import stanza_digest
+
+
+class Species(models.Model):
+    scientific_name = models.CharField(max_length=255, unique=True)
+    taxon_id = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'species'
+
+    def __str__(self):
+        return self.scientific_name
+
+
+class Assembly(models.Model):
+    """
+    A genome assembly as named in genomes.txt (e.g. hg38)
+    """
+    name = models.CharField(max_length=255, unique=True)
+    accession = models.CharField(max_length=255, null=True, blank=True)
+    species = models.ForeignKey(Species, on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'assemblies'
+
+    def __str__(self):
+        return self.name
+
+
+class Hub(models.Model):
+    """
+    A track hub registered by a user, identified by the URL of its hub.txt.
+    `data_version` is bumped each time a (re)submission actually changes
+    the stored content, so it can be used to key caches and derived data.
+    Disabled hubs stay registered but are left out of the search results
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='hubs')
+    url = models.URLField(max_length=255, unique=True)
+    name = models.CharField(max_length=255, db_index=True)
+    short_label = models.CharField(max_length=255)
+    long_label = models.TextField(blank=True)
+    email = models.CharField(max_length=255, blank=True)
+    is_enabled = models.BooleanField(default=True)
+    data_version = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # the hubs of an owner, most recently updated first (users.views.dashboard_hubs)
+            models.Index(fields=['owner', 'updated_at']),
+            # the few disabled hubs, left out of searches (search.search_tracks)
+            models.Index(fields=['is_enabled']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Genome(models.Model):
+    """
+    One genomes.txt stanza of a hub, pointing at the trackDb file of an assembly
+    """
+    hub = models.ForeignKey(Hub, on_delete=models.CASCADE, related_name='genomes')
+    assembly = models.ForeignKey(Assembly, on_delete=models.PROTECT, related_name='genomes')
+    trackdb_url = models.URLField(max_length=255)
+
+    class Meta:
+        unique_together = ('hub', 'assembly')
+
+    def __str__(self):
+        return '{} ({})'.format(self.assembly.name, self.hub.name)
+
+
+class StanzaBlob(models.Model):
+    """
+    The encoded settings of a trackDb stanza (see codec.py), stored once for all the
+    tracks and hub versions with these settings, see blobs.py. `digest` is the
+    parser.stanza_digest() of the settings
+    """
+    digest = models.CharField(max_length=40, primary_key=True)
+    body = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.digest
+
+
+class Track(models.Model):
+    """
+    One trackDb stanza. `name` is the stanza key (the value of its `track`
+    setting) and `blob` holds its settings, keyed by their digest, which is what
+    resubmissions are diffed against.
+    The few settings we filter on are copied to their own indexed columns, and the hub
+    of the genome to `hub`, so that the tracks of a hub can be read in id order from an index
+    """
+    genome = models.ForeignKey(Genome, on_delete=models.CASCADE, related_name='tracks')
+    # always genome.hub, indexed along with the id below
+    hub = models.ForeignKey(Hub, on_delete=models.CASCADE, related_name='tracks', db_index=False)
+    name = models.CharField(max_length=255, db_index=True)
+    blob = models.ForeignKey(StanzaBlob, on_delete=models.PROTECT, related_name='tracks')
+    file_type = models.CharField(max_length=50, blank=True, db_index=True)
+    parent = models.CharField(max_length=255, blank=True)
+    visibility = models.CharField(max_length=20, blank=True)
+    short_label = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # Fields derived from the settings, to be written along with them
+    SETTINGS_FIELDS = ['blob', 'file_type', 'parent', 'visibility', 'short_label']
+
+    class Meta:
+        unique_together = ('genome', 'name')
+        indexes = [
+            models.Index(fields=['genome', 'parent']),
+            # keyset pagination of the tracks of a hub (api.views.HubTrackListView)
+            models.Index(fields=['hub', 'id']),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def save(self, *args, **kwargs):
+        # bulk_create() callers set it themselves (see ingest.sync_tracks)
+        self.hub_id = self.genome.hub_id
+        super().save(*args, **kwargs)
+
+    @property
+    def settings(self):
+        return decode_settings(self.blob.body)
+
+    @settings.setter
+    def settings(self, stanza):
+        """
+        Set the settings of the track, the blob still has to be stored (see blobs.store_blobs)
+        """
+        self.blob = StanzaBlob(digest=stanza_digest(stanza), body=encode_settings(stanza))
+        for field, value in promoted_settings(stanza).items():
+            setattr(self, field, value)
+
+
+class HubDocument(models.Model):
+    """
+    The hub detail API response, rendered once per hub data version at ingest
+    time and served as is. `body_gzip` is empty for documents too small
+    to be worth compressing
+    """
+    hub = models.OneToOneField(Hub, on_delete=models.CASCADE, primary_key=True, related_name='document')
+    data_version = models.PositiveIntegerField()
+    body = models.BinaryField()
+    body_gzip = models.BinaryField(blank=True)
+
+
+class SavedSearch(models.Model):
+    """
+    A track search saved so that its results can be loaded in a genome
+    browser as a virtual hub. `fingerprint` identifies the normalised query
+    """
+    fingerprint = models.CharField(max_length=16, unique=True)
+    query = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.fingerprint
+
+
+class HubMonitor(models.Model):
+    """
+    Availability monitoring state of a hub, see monitor.py.
+    `interval` (seconds) adapts to how stable the hub is and `flaps`
+    counts its recent status changes
+    """
+    hub = models.OneToOneField(Hub, on_delete=models.CASCADE, primary_key=True, related_name='monitor')
+    next_check_at = models.DateTimeField(db_index=True)
+    interval = models.PositiveIntegerField()
+    is_up = models.NullBooleanField()
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    flaps = models.PositiveSmallIntegerField(default=0)
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return str(self.hub)
+
+
+class HubStatusBucket(models.Model):
+    """
+    Availability history of a hub, aggregated over a time bucket of `resolution`
+    seconds: recent buckets are hourly, older ones are merged into daily buckets
+    """
+    hub = models.ForeignKey(Hub, on_delete=models.CASCADE, related_name='status_buckets')
+    start = models.DateTimeField()
+    resolution = models.PositiveIntegerField()
+    probes = models.PositiveIntegerField(default=0)
+    failures = models.PositiveIntegerField(default=0)
+    total_latency_ms = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('hub', 'resolution', 'start')
+        indexes = [
+            models.Index(fields=['resolution', 'start']),
+        ]
+
+    def __str__(self):
+        return '{} {}'.format(self.hub, self.start)
+
+
+class RegistryStat(models.Model):
+    """
+    Precomputed registry statistics: the number of items for each value of a facet
+    (e.g. tracks per file type), maintained incrementally by stats.py
+    """
+    facet = models.CharField(max_length=32)
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('facet', 'value')
+        indexes = [
+            models.Index(fields=['facet', 'count']),
+        ]
+
+    def __str__(self):
+        return '{} {}: {}'.format(self.facet, self.value, self.count)
+
+
+class HubBatch(models.Model):
+    """
+    A list of operations on the hubs of an owner run in the background
+    by the run_hub_batches command, see batch.py. `operations` and
+    `results` are JSON lists, `error` is set if the batch failed as a whole.
+    `lease_expires_at` and `attempts` let a batch interrupted by its worker be run again
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='hub_batches')
+    operations = models.TextField()
+    results = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['started_at', 'created_at']),
+        ]
+
+    def __str__(self):
+        return '{} by {}'.format(self.pk, self.owner)
+
+
+class HubVersion(models.Model):
+    """
+    A version of a hub, recorded each time a submission changes it: the hub.txt settings
+    and the digests of the stanzas of each genome, in a compressed manifest (see blobs.py)
+    """
+    hub = models.ForeignKey(Hub, on_delete=models.CASCADE, related_name='versions')
+    data_version = models.PositiveIntegerField()
+    manifest = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('hub', 'data_version')
+
+    def __str__(self):
+        return '{} version {}'.format(self.hub, self.data_version)
@@ -0,0 +1,232 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import http.client
+import logging
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Hub, HubMonitor, HubStatusBucket
+
+"""
+Availability monitoring of the registered hubs.
+
+Each hub is checked at its own adaptive interval: it grows while the hub keeps
+the same status, drops back to MIN_INTERVAL when the status changes and stays
+there while the hub flaps. Unreachable hubs are retried with an exponential
+backoff. Checks are polite to the hosting servers: at most one request at a
+time and one every HOST_DELAY seconds per host, and no more than
+MAX_CHECKS_PER_HOST per run, the rest being left for the next run.
+
+Results are aggregated in hourly HubStatusBucket rows, merged into daily
+buckets after HOURLY_RETENTION.
+"""
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL = 5 * 60
+DEFAULT_INTERVAL = 30 * 60
+MAX_INTERVAL = 24 * 3600
+MAX_BACKOFF = 7 * 24 * 3600
+INTERVAL_GROWTH = 1.5
+# status changes within the decay window above which a hub is considered flapping
+FLAP_THRESHOLD = 3
+JITTER = 0.1
+
+PROBE_TIMEOUT = 10
+HOST_DELAY = 2
+MAX_CHECKS_PER_HOST = 30
+MAX_CONCURRENT_HOSTS = 16
+
+HOUR = 3600
+DAY = 24 * HOUR
+HOURLY_RETENTION = timedelta(days=7)
+
+
+def probe(url):
+    """
+    Check that a hub.txt can be downloaded
+    :param url: the hub URL
+    :returns: whether the hub is up, the latency in ms and the error message if any
+    """
+    start = time.monotonic()
+    try:
+        with urlopen(Request(url, headers={'User-Agent': 'TrackHubRegistry-monitor'}),
+                     timeout=PROBE_TIMEOUT) as response:
+            response.read(1024)
+        error = ''
+    except (OSError, ValueError, http.client.HTTPException) as exception:
+        error = str(exception)[:255] or exception.__class__.__name__
+    return not error, int((time.monotonic() - start) * 1000), error
+
+
+def next_interval(monitor, is_up):
+    """
+    Update the monitoring state of a hub after a check
+    :param monitor: the HubMonitor, updated in place
+    :param is_up: the result of the check
+    :returns: the number of seconds until the next check
+    """
+    changed = monitor.is_up is not None and monitor.is_up != is_up
+    if changed:
+        monitor.flaps = min(monitor.flaps + 1, 100)
+    elif monitor.flaps:
+        monitor.flaps -= 1
+    monitor.is_up = is_up
+
+    if is_up:
+        monitor.consecutive_failures = 0
+        if changed or monitor.flaps >= FLAP_THRESHOLD:
+            interval = MIN_INTERVAL
+        else:
+            interval = min(int(monitor.interval * INTERVAL_GROWTH), MAX_INTERVAL)
+    else:
+        monitor.consecutive_failures += 1
+        # confirm a new failure quickly, then back off
+        interval = min(MIN_INTERVAL * 2 ** (monitor.consecutive_failures - 1), MAX_BACKOFF)
+    monitor.interval = max(interval, MIN_INTERVAL)
+    # spread the checks so that hubs registered together aren't checked together forever
+    return monitor.interval * random.uniform(1 - JITTER, 1 + JITTER)
+
+
+def ensure_monitors(now=None):
+    """
+    Start monitoring the hubs that aren't yet, with their first check spread over DEFAULT_INTERVAL
+    """
+    now = now or timezone.now()
+    monitors = [
+        HubMonitor(hub_id=pk, interval=DEFAULT_INTERVAL,
+                   next_check_at=now + timedelta(seconds=random.uniform(0, DEFAULT_INTERVAL)))
+        for pk in Hub.objects.filter(monitor__isnull=True).values_list('pk', flat=True)
+    ]
+    HubMonitor.objects.bulk_create(monitors, batch_size=500)
+    return len(monitors)
+
+
+def _check_host(monitors):
+    results = []
+    for position, monitor in enumerate(monitors):
+        if position:
+            time.sleep(HOST_DELAY)
+        results.append((monitor, probe(monitor.hub.url)))
+    return results
+
+
+def record(monitor, is_up, latency_ms, error, now):
+    """
+    Store the result of a check in the monitor (not saved) and its hourly bucket
+    """
+    delay = next_interval(monitor, is_up)
+    monitor.last_checked_at = now
+    monitor.last_error = error
+    monitor.next_check_at = now + timedelta(seconds=delay)
+
+    start = now.replace(minute=0, second=0, microsecond=0)
+    updated = HubStatusBucket.objects.filter(hub_id=monitor.hub_id, resolution=HOUR, start=start).update(
+        probes=F('probes') + 1, failures=F('failures') + int(not is_up),
+        total_latency_ms=F('total_latency_ms') + latency_ms,
+    )
+    if not updated:
+        HubStatusBucket.objects.create(hub_id=monitor.hub_id, resolution=HOUR, start=start, probes=1,
+                                       failures=int(not is_up), total_latency_ms=latency_ms)
+
+
+def run_checks(batch_size=1000):
+    """
+    Check the hubs that are due, see the module docstring
+    :param batch_size: the maximum number of hubs to check
+    :returns: the number of hubs checked
+    """
+    ensure_monitors()
+    due = HubMonitor.objects.filter(next_check_at__lte=timezone.now()).select_related('hub').order_by(
+        'next_check_at')
+    by_host = defaultdict(list)
+    selected = 0
+    # hosts over their quota don't take the room of the others in the batch
+    for monitor in due.iterator():
+        host = urlparse(monitor.hub.url).netloc.lower()
+        if len(by_host[host]) < MAX_CHECKS_PER_HOST:
+            by_host[host].append(monitor)
+            selected += 1
+            if selected == batch_size:
+                break
+
+    # the probes run in threads, the database is only used from this one
+    checked = []
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_HOSTS) as pool:
+        for results in pool.map(_check_host, by_host.values()):
+            checked.extend(results)
+
+    now = timezone.now()
+    with transaction.atomic():
+        for monitor, (is_up, latency_ms, error) in checked:
+            record(monitor, is_up, latency_ms, error, now)
+        HubMonitor.objects.bulk_update(
+            [monitor for monitor, _ in checked],
+            ['next_check_at', 'interval', 'is_up', 'consecutive_failures', 'flaps', 'last_checked_at', 'last_error'],
+            batch_size=500,
+        )
+    return len(checked)
+
+
+def compact_history(now=None):
+    """
+    Merge the hourly buckets older than HOURLY_RETENTION into daily buckets
+    :returns: the number of hourly buckets merged
+    """
+    now = now or timezone.now()
+    cutoff = (now - HOURLY_RETENTION).replace(hour=0, minute=0, second=0, microsecond=0)
+    hourly = HubStatusBucket.objects.filter(resolution=HOUR, start__lt=cutoff)
+
+    daily = defaultdict(lambda: [0, 0, 0])
+    for hub_id, start, probes, failures, latency in hourly.values_list(
+            'hub_id', 'start', 'probes', 'failures', 'total_latency_ms').iterator():
+        totals = daily[(hub_id, start.replace(hour=0))]
+        totals[0] += probes
+        totals[1] += failures
+        totals[2] += latency
+    if not daily:
+        return 0
+
+    with transaction.atomic():
+        for (hub_id, start), (probes, failures, latency) in daily.items():
+            bucket, created = HubStatusBucket.objects.get_or_create(
+                hub_id=hub_id, resolution=DAY, start=start,
+                defaults={'probes': probes, 'failures': failures, 'total_latency_ms': latency},
+            )
+            if not created:
+                HubStatusBucket.objects.filter(pk=bucket.pk).update(
+                    probes=F('probes') + probes, failures=F('failures') + failures,
+                    total_latency_ms=F('total_latency_ms') + latency,
+                )
+        merged = hourly.delete()[0]
+    return merged
+
+
+def uptime(hub, since):
+    """
+    :returns: the fraction of successful checks of a hub since a date, None if it wasn't checked
+    """
+    totals = hub.status_buckets.filter(start__gte=since).aggregate(probes=Sum('probes'), failures=Sum('failures'))
+    if not totals['probes']:
+        return None
+    return 1 - totals['failures'] / totals['probes']
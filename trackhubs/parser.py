@@ -0,0 +1,120 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from urllib.parse import urljoin
+from urllib.request import urlopen
+
+FETCH_TIMEOUT = 30
+
+
+class HubParseError(Exception):
+    pass
+
+
+def fetch_text(url):
+    """
+    Download a hub file and return its content as text
+    :param url: the file URL
+    :returns: the decoded content
+    """
+    with urlopen(url, timeout=FETCH_TIMEOUT) as response:
+        return response.read().decode('utf-8', errors='replace')
+
+
+def parse_stanzas(text):
+    """
+    Split a UCSC style settings file (hub.txt, genomes.txt, trackDb.txt) into stanzas.
+    Stanzas are separated by blank lines, lines starting with '#' are comments
+    and a trailing backslash continues a setting on the next line
+    :param text: the file content
+    :returns: a list of OrderedDict, one per stanza, mapping setting to value
+    """
+    stanzas = []
+    current = OrderedDict()
+    pending = ''
+    for raw_line in text.splitlines():
+        line = pending + raw_line.strip()
+        pending = ''
+        if line.endswith('\\'):
+            pending = line[:-1].rstrip() + ' '
+            continue
+        if not line:
+            if current:
+                stanzas.append(current)
+                current = OrderedDict()
+            continue
+        if line.startswith('#'):
+            continue
+        key, _, value = line.partition(' ')
+        current[key] = value.strip()
+    if pending.strip():
+        key, _, value = pending.strip().partition(' ')
+        current[key] = value.strip()
+    if current:
+        stanzas.append(current)
+    return stanzas
+
+
+def stanza_digest(stanza):
+    """
+    Digest of a stanza's content, independent of the order of its settings
+    :param stanza: the mapping of setting to value
+    :returns: the hex SHA-1 of the canonical form of the stanza
+    """
+    canonical = json.dumps(sorted(stanza.items()), separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def load_hub(url):
+    """
+    Fetch and parse a hub.txt and every file it references
+    :param url: the URL of hub.txt
+    :returns: a dict with the 'hub' settings and a list of 'genomes', each one with its
+    'genome' name, 'scientific_name' (empty if not declared), 'trackdb_url' and parsed track 'stanzas'
+    """
+    hub_stanzas = parse_stanzas(fetch_text(url))
+    if not hub_stanzas or 'hub' not in hub_stanzas[0]:
+        raise HubParseError('{} is not a valid hub.txt'.format(url))
+    hub = hub_stanzas[0]
+
+    if hub.get('useOneFile') == 'on':
+        genome_stanzas = [s for s in hub_stanzas[1:] if 'genome' in s]
+        track_stanzas = [s for s in hub_stanzas[1:] if 'track' in s]
+        genomes = [{
+            'genome': genome_stanzas[0]['genome'] if genome_stanzas else '',
+            'scientific_name': genome_stanzas[0].get('scientificName', '') if genome_stanzas else '',
+            'trackdb_url': url,
+            'stanzas': track_stanzas,
+        }]
+    else:
+        if 'genomesFile' not in hub:
+            raise HubParseError('{} has no genomesFile'.format(url))
+        genomes_url = urljoin(url, hub['genomesFile'])
+        genomes = []
+        for stanza in parse_stanzas(fetch_text(genomes_url)):
+            if 'genome' not in stanza or 'trackDb' not in stanza:
+                raise HubParseError('Invalid genome stanza in {}'.format(genomes_url))
+            trackdb_url = urljoin(genomes_url, stanza['trackDb'])
+            genomes.append({
+                'genome': stanza['genome'],
+                'scientific_name': stanza.get('scientificName', ''),
+                'trackdb_url': trackdb_url,
+                'stanzas': [s for s in parse_stanzas(fetch_text(trackdb_url)) if 'track' in s],
+            })
+
+    if not genomes or not genomes[0]['genome']:
+        raise HubParseError('{} does not declare any genome'.format(url))
+    return {'hub': hub, 'genomes': genomes}
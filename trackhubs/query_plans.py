@@ -0,0 +1,239 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import json
+import os
+import re
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError
+from django.db import connection
+from django.db.transaction import TransactionManagementError
+from rest_framework.authtoken.models import Token
+
+from users.views import dashboard_hubs
+from .api.serializers import TrackProjection
+from .codec import encode_settings
+from .ingest import BATCH_SIZE
+from .models import Assembly, Genome, Hub, HubDocument, Species, StanzaBlob, Track
+from .search import normalize_query, search_tracks
+
+"""
+Query plans of the hot ORM queries, to catch schema or query changes that turn
+indexed lookups into table scans or sorts.
+
+The queries run against a seeded dataset, their plans are reduced to one line per
+step (table, access type, index used, extra work) and flagged for full table or
+index scans and for sorts or temporary tables. query_plans.json holds the accepted
+plans per database vendor: any flag not in it is a regression.
+"""
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'query_plans.json')
+
+SEED_USERS = 10
+SEED_HUBS = 50
+SEED_GENOMES = 2
+SEED_TRACKS = 100
+FILE_TYPES = ('bigWig', 'bigBed', 'bam', 'vcfTabix')
+
+# MySQL EXPLAIN access types reading a whole table or index
+MYSQL_SCANS = {'ALL': 'full scan', 'index': 'full index scan'}
+MYSQL_EXTRAS = {'Using filesort': 'filesort', 'Using temporary': 'temporary table'}
+
+
+def seed():
+    """
+    Fill the database with SEED_USERS users owning SEED_HUBS hubs of SEED_GENOMES genomes
+    of SEED_TRACKS tracks, and update the statistics of the planner
+    :returns: a dict of the objects the queries look up: user, token and hub
+    """
+    User.objects.bulk_create(User(username='query-plans{}'.format(number)) for number in range(SEED_USERS))
+    users = list(User.objects.filter(username__startswith='query-plans').order_by('pk'))
+    for user in users:
+        Token.objects.create(user=user)
+    species = Species.objects.create(scientific_name='Seeded species')
+    Assembly.objects.bulk_create(
+        Assembly(name='seeded{}'.format(number), species=species) for number in range(SEED_GENOMES * 5)
+    )
+    assemblies = list(Assembly.objects.filter(species=species).order_by('pk'))
+    Hub.objects.bulk_create(
+        Hub(owner=users[number % len(users)], url='http://example.com/seeded{}/hub.txt'.format(number),
+            name='seeded{}'.format(number), short_label='Seeded hub {}'.format(number), data_version=1)
+        for number in range(SEED_HUBS)
+    )
+    hubs = list(Hub.objects.filter(owner__in=users).order_by('pk'))
+    HubDocument.objects.bulk_create(HubDocument(hub=hub, data_version=1, body=b'{}', body_gzip=b'') for hub in hubs)
+    Genome.objects.bulk_create(
+        Genome(hub=hub, assembly=assemblies[(index + number) % len(assemblies)],
+               trackdb_url='{}/trackDb.txt'.format(hub.url))
+        for index, hub in enumerate(hubs) for number in range(SEED_GENOMES)
+    )
+    genomes = Genome.objects.filter(hub__in=hubs)
+    blob = StanzaBlob.objects.create(digest='0' * 40, body=encode_settings({}))
+    Track.objects.bulk_create(
+        (Track(genome=genome, hub_id=genome.hub_id, name='track{}'.format(number), short_label='Track {}'.format(number),
+               file_type=FILE_TYPES[number % len(FILE_TYPES)], blob=blob)
+         for genome in genomes for number in range(SEED_TRACKS)),
+        batch_size=BATCH_SIZE,
+    )
+    analyze([User, Token, Species, Assembly, Hub, HubDocument, Genome, Track])
+    hub = hubs[len(hubs) // 2]
+    return {'user': hub.owner, 'token': hub.owner.auth_token.key, 'hub': hub.pk}
+
+
+def analyze(models):
+    """
+    Update the statistics of the planner for the tables of models
+    :raises TransactionManagementError: on MySQL inside a transaction, which ANALYZE TABLE would commit
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            if connection.in_atomic_block:
+                raise TransactionManagementError('ANALYZE TABLE would commit the current transaction')
+            cursor.execute('ANALYZE TABLE ' + ', '.join(model._meta.db_table for model in models))
+            cursor.fetchall()
+        elif connection.vendor == 'sqlite':
+            cursor.execute('ANALYZE')
+
+
+def key_queries(seeded):
+    """
+    The querysets of the hot paths, built the way the views build them
+    :param seeded: the objects returned by seed()
+    :returns: an OrderedDict of name to queryset
+    """
+    projection = list(TrackProjection.fields.values())
+    hub = seeded['hub']
+    return OrderedDict([
+        # SearchView and HubTrackListView, keyset paginated
+        ('search', search_tracks(normalize_query({'assembly': 'seeded1', 'type': 'bigWig'})).filter(
+            pk__gt=0).values_list(*projection)[:100]),
+        ('search_text', search_tracks(normalize_query({'q': 'track 1'})).filter(
+            pk__gt=0).values_list(*projection)[:100]),
+        ('hub_tracks', Track.objects.filter(hub_id=hub, pk__gt=0).order_by('pk').values_list(
+            *projection)[:1000]),
+        # documents.hub_document_version and hub_document_body
+        ('hub_detail', HubDocument.objects.filter(hub_id=hub).values_list('hub__data_version', 'data_version')),
+        ('hub_detail_body', HubDocument.objects.filter(hub_id=hub).values_list('data_version', 'body_gzip')),
+        ('hub_list', Hub.objects.select_related('owner').filter(pk__gt=0).order_by('pk')[:100]),
+        ('dashboard', dashboard_hubs(seeded['user'])),
+        # rest_framework.authentication.TokenAuthentication
+        ('token_auth', Token.objects.select_related('user').filter(key=seeded['token'])),
+    ])
+
+
+def explain(queryset):
+    """
+    :returns: the plan of a queryset, a list of steps, and the list of its flags
+    :raises CommandError: for database vendors other than MySQL and SQLite
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [column[0] for column in cursor.description]
+            return _mysql_plan([dict(zip(columns, row)) for row in cursor.fetchall()])
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return _sqlite_plan([row[-1] for row in cursor.fetchall()])
+    raise CommandError('No query plans for {}'.format(connection.vendor))
+
+
+def _mysql_plan(rows):
+    plan = []
+    flags = []
+    for row in rows:
+        extra = row.get('Extra') or ''
+        plan.append('{}: {} {} {}'.format(row['table'], row['type'], row['key'], extra).rstrip())
+        if row['type'] in MYSQL_SCANS:
+            flags.append('{} of {}'.format(MYSQL_SCANS[row['type']], row['table']))
+        for marker, flag in MYSQL_EXTRAS.items():
+            if marker in extra:
+                flags.append('{} for {}'.format(flag, row['table']))
+    return plan, flags
+
+
+def _sqlite_plan(details):
+    plan = []
+    flags = []
+    for detail in details:
+        # "SCAN TABLE x" before SQLite 3.36, "SCAN x" since
+        detail = re.sub(r'^(SCAN|SEARCH) TABLE ', r'\1 ', detail)
+        plan.append(detail)
+        words = detail.split()
+        if words[0] == 'SCAN' and len(words) > 1:
+            flags.append('{} of {}'.format('full index scan' if 'INDEX' in words else 'full scan', words[1]))
+        elif 'TEMP B-TREE' in detail:
+            # e.g. USE TEMP B-TREE FOR ORDER BY
+            flags.append('{} for {}'.format('filesort' if 'ORDER BY' in detail else 'temporary table',
+                                            detail.split(' FOR ', 1)[-1]))
+    return plan, flags
+
+
+def check_plans(seeded):
+    """
+    :returns: an OrderedDict of query name to {'plan', 'flags'}
+    """
+    plans = OrderedDict()
+    for name, queryset in key_queries(seeded).items():
+        plan, flags = explain(queryset)
+        plans[name] = {'plan': plan, 'flags': flags}
+    return plans
+
+
+def load_baseline(path=None):
+    """
+    :returns: the accepted plans for the database in use, None if there are none
+    """
+    path = path or BASELINE_PATH
+    try:
+        with open(path) as baseline_file:
+            return json.load(baseline_file).get(connection.vendor)
+    except FileNotFoundError:
+        return None
+
+
+def save_baseline(plans, path=None):
+    """
+    Accept the plans for the database in use, keeping those of the other vendors
+    """
+    path = path or BASELINE_PATH
+    try:
+        with open(path) as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        baseline = {}
+    baseline[connection.vendor] = plans
+    with open(path, 'w') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
+
+
+def compare(plans, baseline):
+    """
+    :returns: the regressions (flags missing from the baseline) and the plan changes,
+        each a list of (query name, description)
+    """
+    regressions = []
+    changes = []
+    for name, current in plans.items():
+        accepted = baseline.get(name)
+        if accepted is None:
+            regressions.extend((name, flag) for flag in current['flags'])
+            changes.append((name, 'not in the baseline'))
+            continue
+        regressions.extend((name, flag) for flag in current['flags'] if flag not in accepted['flags'])
+        if current['plan'] != accepted['plan']:
+            changes.append((name, '{} -> {}'.format(' | '.join(accepted['plan']), ' | '.join(current['plan']))))
+    return regressions, changes
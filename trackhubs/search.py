@@ -0,0 +1,125 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from urllib.parse import urljoin
+
+from django.db.models import Q
+
+from .codec import decode_settings
+from .models import Hub, Track
+
+# Track search parameters, mapped to the lookup they filter on
+FILTERS = OrderedDict([
+    ('assembly', 'genome__assembly__name'),
+    ('species', 'genome__assembly__species__scientific_name'),
+    ('type', 'file_type'),
+    ('hub', 'hub_id'),
+])
+QUERY_PARAMETERS = ('q',) + tuple(FILTERS)
+
+# Settings holding a URL, possibly relative to the trackDb file
+URL_SETTINGS = ('bigDataUrl', 'bigDataIndex', 'html', 'searchTrix', 'linkDataUrl', 'refUrl')
+# Settings tying a track to others of its hub, dropped from virtual hubs as tracks are flattened
+RELATION_SETTINGS = ('parent', 'subGroups', 'superTrack', 'compositeTrack', 'view', 'container')
+
+MAX_VIRTUAL_HUB_TRACKS = 5000
+
+
+def normalize_query(params):
+    """
+    Keep the known search parameters, with their values stripped
+    :param params: a mapping, e.g. the request query parameters
+    :returns: an OrderedDict of the non-empty parameters, sorted by name
+    """
+    query = OrderedDict()
+    for name in sorted(QUERY_PARAMETERS):
+        value = str(params.get(name, '')).strip()
+        if value:
+            query[name] = value
+    return query
+
+
+def query_fingerprint(query):
+    """
+    :param query: a normalised query
+    :returns: a short digest identifying the query
+    """
+    return hashlib.sha1(json.dumps(query).encode('utf-8')).hexdigest()[:16]
+
+
+def search_tracks(query):
+    """
+    :param query: a normalised query
+    :returns: the queryset of the matching tracks, ordered by id
+    """
+    # hubs are matched by subqueries run once rather than joined, so that the tracks are read
+    # in id order and pages need no sort
+    tracks = Track.objects.exclude(hub_id__in=Hub.objects.filter(is_enabled=False).values('pk'))
+    if 'q' in query:
+        tracks = tracks.filter(
+            Q(short_label__icontains=query['q'])
+            | Q(hub_id__in=Hub.objects.filter(short_label__icontains=query['q']).values('pk'))
+        )
+    for name, lookup in FILTERS.items():
+        if name in query:
+            tracks = tracks.filter(**{lookup: query[name]})
+    return tracks.order_by('pk')
+
+
+def virtual_hub_txt(fingerprint, query, email):
+    description = ', '.join('{}={}'.format(name, value) for name, value in query.items()) or 'all tracks'
+    yield (
+        'hub thr_search_{}\n'
+        'shortLabel THR search {}\n'
+        'longLabel Track Hub Registry search: {}\n'
+        'genomesFile genomes.txt\n'
+        'email {}\n'
+    ).format(fingerprint, fingerprint[:6], description, email)
+
+
+def virtual_genomes_txt(query):
+    assemblies = search_tracks(query).order_by().values_list('genome__assembly__name', flat=True).distinct()
+    for assembly in sorted(assemblies):
+        yield 'genome {0}\ntrackDb {0}/trackDb.txt\n\n'.format(assembly)
+
+
+def virtual_trackdb_txt(query, assembly):
+    """
+    Generate the trackDb of a virtual hub, a stanza at a time. Tracks are renamed
+    after their hub to be unique, flattened (composite and view containers are left out)
+    and their relative URLs resolved
+    """
+    tracks = search_tracks(query).filter(genome__assembly__name=assembly).values_list(
+        'hub_id', 'genome__trackdb_url', 'blob__body'
+    )
+    count = 0
+    for hub_id, trackdb_url, body in tracks.iterator():
+        settings = decode_settings(body)
+        if 'bigDataUrl' not in settings:
+            continue
+        # the visibility may have come from a container
+        settings.setdefault('visibility', 'dense')
+        lines = ['track hub{}_{}'.format(hub_id, settings.pop('track'))]
+        for name, value in settings.items():
+            if name in RELATION_SETTINGS:
+                continue
+            if name in URL_SETTINGS:
+                value = urljoin(trackdb_url, value)
+            lines.append('{} {}'.format(name, value))
+        yield '\n'.join(lines) + '\n\n'
+        count += 1
+        if count == MAX_VIRTUAL_HUB_TRACKS:
+            break
@@ -0,0 +1,118 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import logging
+import threading
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from .cache import assembly_cache, hub_list_cache, virtual_hub_cache
+from .models import Assembly, Genome, Hub, Species
+from .stats import apply_deltas, hub_deltas
+from .suggest import object_names, suggest_index
+
+logger = logging.getLogger(__name__)
+
+REFRESH_TIMEOUT = 5
+# the proxy caches a variant of each response per encoding, see proxy/default.conf
+REFRESH_ENCODINGS = ('identity', 'gzip')
+
+
+def refresh_proxy_cache(paths):
+    """
+    Ask the proxy to refetch the given paths, replacing its cached copies of every encoding
+    (see proxy/default.conf). Cached search results aren't refreshed, they expire within the proxy cache TTL
+    :param paths: the URL paths to refresh
+    """
+    for path in paths:
+        for encoding in REFRESH_ENCODINGS:
+            request = Request(settings.PROXY_CACHE_REFRESH_URL + path, headers={'Accept-Encoding': encoding})
+            try:
+                with urlopen(request, timeout=REFRESH_TIMEOUT) as response:
+                    response.read()
+            except OSError as error:
+                # 404s included: the refreshed entry is cached all the same
+                logger.debug('Refreshing %s (%s) in the proxy cache: %s', path, encoding, error)
+
+
+def hub_paths(hub):
+    return [reverse('hub_list_api'), reverse('hub_detail_api', kwargs={'pk': hub.pk})]
+
+
+@receiver(post_save, sender=Hub)
+@receiver(post_delete, sender=Hub)
+def purge_hub(sender, instance, **kwargs):
+    if not settings.PROXY_CACHE_REFRESH_URL:
+        return
+    paths = hub_paths(instance)
+    # refresh once the change is visible to other connections, without holding up the request
+    transaction.on_commit(
+        lambda: threading.Thread(target=refresh_proxy_cache, args=(paths,), daemon=True).start()
+    )
+
+
+@receiver(post_save, sender=Hub)
+@receiver(post_delete, sender=Hub)
+def invalidate_hub(sender, instance, **kwargs):
+    # after commit, or a concurrent read could cache the old data again
+    transaction.on_commit(hub_list_cache.invalidate)
+    # any hub change can change the results of any search
+    transaction.on_commit(virtual_hub_cache.invalidate)
+
+
+@receiver(post_save, sender=Species)
+@receiver(post_delete, sender=Species)
+@receiver(post_save, sender=Assembly)
+@receiver(post_delete, sender=Assembly)
+@receiver(post_save, sender=Genome)
+@receiver(post_delete, sender=Genome)
+def invalidate_assemblies(sender, instance, **kwargs):
+    transaction.on_commit(assembly_cache.invalidate)
+
+
+@receiver(pre_delete, sender=Hub)
+def remove_hub_stats(sender, instance, **kwargs):
+    # before the genomes and tracks are deleted along with the hub
+    apply_deltas(hub_deltas(instance, -1))
+
+
+@receiver(pre_save, sender=Species)
+@receiver(pre_save, sender=Assembly)
+@receiver(pre_save, sender=Hub)
+def remember_suggested_names(sender, instance, **kwargs):
+    # without an index in this process (e.g. run_hub_batches) the stored names tell what changed
+    if suggest_index.version is None and instance.pk is not None:
+        previous = sender.objects.filter(pk=instance.pk).first()
+        instance._suggested_names = object_names(previous)[1] if previous is not None else []
+
+
+@receiver(post_save, sender=Species)
+@receiver(post_delete, sender=Species)
+@receiver(post_save, sender=Assembly)
+@receiver(post_delete, sender=Assembly)
+@receiver(post_save, sender=Hub)
+@receiver(post_delete, sender=Hub)
+def update_suggestions(sender, instance, **kwargs):
+    kind, names = object_names(instance)
+    if 'created' in kwargs:
+        previous = getattr(instance, '_suggested_names', None)
+    else:
+        # deleted
+        previous, names = names, []
+    pk = instance.pk
+    transaction.on_commit(lambda: suggest_index.apply(kind, pk, names, previous))
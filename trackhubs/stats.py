@@ -0,0 +1,169 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+from collections import Counter, OrderedDict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import Genome, Hub, RegistryStat, Track
+
+"""
+Registry statistics kept in the RegistryStat summary table, so that the home page
+and facet counts read a few rows instead of aggregating the track table.
+
+Ingestion and deletion apply deltas as they change the data (see ingest.py and
+signals.py), the reconcile_stats command recomputes everything periodically to
+catch up with changes made outside of them.
+
+Facets:
+    total: number of hubs, genomes and tracks
+    species: number of hubs per species, from the species of their assemblies
+    assembly: number of hubs per assembly
+    file_type: number of tracks per file type
+"""
+
+TOTAL = 'total'
+SPECIES = 'species'
+ASSEMBLY = 'assembly'
+FILE_TYPE = 'file_type'
+
+
+def apply_deltas(deltas):
+    """
+    Add deltas to the statistics
+    :param deltas: a Counter of (facet, value) to the number to add (negative to subtract)
+    """
+    for (facet, value), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        value = value[:255]
+        if RegistryStat.objects.filter(facet=facet, value=value).update(count=F('count') + delta):
+            continue
+        try:
+            with transaction.atomic():
+                RegistryStat.objects.create(facet=facet, value=value, count=delta)
+        except IntegrityError:
+            # created concurrently
+            RegistryStat.objects.filter(facet=facet, value=value).update(count=F('count') + delta)
+
+
+def genome_deltas(genomes, sign=1):
+    """
+    :param genomes: a Genome queryset
+    :param sign: 1 for genomes being added, -1 for genomes being removed
+    :returns: the Counter of the changes to the statistics, tracks included, species excluded
+        as they count hubs (see species_deltas)
+    """
+    deltas = Counter()
+    for assembly, in genomes.values_list('assembly__name'):
+        deltas[(TOTAL, 'genomes')] += sign
+        deltas[(ASSEMBLY, assembly)] += sign
+    tracks = Track.objects.filter(genome__in=genomes).values_list('file_type').annotate(count=Count('pk'))
+    for file_type, count in tracks.order_by():
+        deltas[(TOTAL, 'tracks')] += sign * count
+        deltas[(FILE_TYPE, file_type)] += sign * count
+    return deltas
+
+
+def hub_species(hub):
+    """
+    :returns: the set of the names of the species of the assemblies of a hub
+    """
+    return set(Genome.objects.filter(hub=hub, assembly__species__isnull=False).values_list(
+        'assembly__species__scientific_name', flat=True))
+
+
+def species_deltas(before, after):
+    """
+    :param before: the species of a hub before a change, see hub_species()
+    :param after: its species after the change
+    :returns: the Counter of the changes to the species statistics
+    """
+    deltas = Counter()
+    for species in after - before:
+        deltas[(SPECIES, species)] += 1
+    for species in before - after:
+        deltas[(SPECIES, species)] -= 1
+    return deltas
+
+
+def assembly_species_deltas(assembly, species, hub):
+    """
+    :param assembly: an Assembly without species, about to be assigned one
+    :param species: the Species
+    :param hub: the Hub making the change, left out as it counts its own changes
+    :returns: the Counter of the changes to the species statistics for the other hubs of the assembly
+    """
+    hubs = Genome.objects.filter(assembly=assembly).exclude(hub=hub).values('hub')
+    counted = Genome.objects.filter(hub__in=hubs, assembly__species=species).values('hub')
+    return Counter({(SPECIES, species.scientific_name): hubs.distinct().count() - counted.distinct().count()})
+
+
+def hub_deltas(hub, sign=1):
+    """
+    :returns: the Counter of the changes to the statistics when a whole hub is added or removed
+    """
+    deltas = genome_deltas(Genome.objects.filter(hub=hub), sign)
+    deltas[(TOTAL, 'hubs')] += sign
+    for species in hub_species(hub):
+        deltas[(SPECIES, species)] += sign
+    return deltas
+
+
+def compute_stats():
+    """
+    Compute all the statistics from scratch
+    :returns: a Counter of (facet, value) to count
+    """
+    stats = Counter({(TOTAL, 'hubs'): Hub.objects.count()})
+    stats.update(genome_deltas(Genome.objects.all()))
+    species = Genome.objects.filter(assembly__species__isnull=False).values_list(
+        'assembly__species__scientific_name').annotate(hubs=Count('hub', distinct=True))
+    for name, hubs in species.order_by():
+        stats[(SPECIES, name)] = hubs
+    return stats
+
+
+@transaction.atomic
+def reconcile():
+    """
+    Replace the statistics by freshly computed ones, only rewriting the rows that differ
+    :returns: the number of rows fixed
+    """
+    expected = compute_stats()
+    fixed = 0
+    for stat in RegistryStat.objects.select_for_update():
+        count = expected.pop((stat.facet, stat.value), 0)
+        if stat.count != count:
+            stat.count = count
+            stat.save(update_fields=['count'])
+            fixed += 1
+    missing = [RegistryStat(facet=facet, value=value, count=count) for (facet, value), count in expected.items() if count]
+    RegistryStat.objects.bulk_create(missing)
+    RegistryStat.objects.filter(count=0).delete()
+    return fixed + len(missing)
+
+
+def registry_stats(top=10):
+    """
+    :param top: maximum number of values returned per facet
+    :returns: an OrderedDict of facet to list of (value, count), largest counts first
+    """
+    stats = OrderedDict()
+    for facet in (TOTAL, SPECIES, ASSEMBLY, FILE_TYPE):
+        stats[facet] = list(
+            RegistryStat.objects.filter(facet=facet, count__gt=0).order_by('-count', 'value').values_list(
+                'value', 'count')[:top]
+        )
+    return stats
@@ -0,0 +1,208 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import bisect
+import logging
+import threading
+
+from django.db import connection
+
+from .cache import TieredCache
+from .models import Assembly, Hub, Species
+
+"""
+In-memory typeahead over species names, assembly names and accessions, and hub short labels.
+
+Every worker keeps a sorted array of the normalised names, and of every word they contain
+after the first one, so a prefix lookup is a binary search and never reaches the database.
+The index is built when the worker starts (see thr/warmup.py) and updated in place by the
+worker saving or deleting a name (see signals.py). Changes also bump the version of the
+suggest namespace of the shared cache, which makes the other workers rebuild their index
+within cache.LOCAL_TTL seconds. They rebuild it in a background thread, and keep serving
+the previous one meanwhile.
+"""
+
+logger = logging.getLogger(__name__)
+
+SPECIES = 'species'
+ASSEMBLY = 'assembly'
+HUB = 'hub'
+
+MAX_SUGGESTIONS = 10
+# entries looked at per query: a prefix matching more has enough suggestions anyway
+MAX_SCANNED = 200
+
+suggest_cache = TieredCache('suggest')
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def object_names(instance):
+    """
+    :returns: the kind of a Species, Assembly or Hub and the names it is suggested by
+    """
+    if isinstance(instance, Species):
+        return SPECIES, [instance.scientific_name]
+    if isinstance(instance, Assembly):
+        return ASSEMBLY, [instance.name, instance.accession]
+    if isinstance(instance, Hub):
+        return HUB, [instance.short_label]
+    raise TypeError('No suggestions for {}'.format(type(instance).__name__))
+
+
+def _index_keys(name):
+    words = normalize(name).split(' ')
+    return {' '.join(words[start:]) for start in range(len(words)) if words[start]}
+
+
+class SuggestIndex:
+    """
+    Sorted array of (key, kind, name, pk) entries, see the module docstring
+    """
+
+    def __init__(self):
+        self.version = None
+        self._entries = []
+        # (kind, pk) to the entries of the object, to remove them when it changes
+        self._objects = {}
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self):
+        """
+        Load all the names from the database, replacing the current index
+        :returns: the number of entries
+        """
+        version = suggest_cache.version()
+        objects = {}
+        querysets = [
+            (SPECIES, Species.objects.values_list('pk', 'scientific_name')),
+            (ASSEMBLY, Assembly.objects.values_list('pk', 'name', 'accession')),
+            (HUB, Hub.objects.values_list('pk', 'short_label')),
+        ]
+        for kind, queryset in querysets:
+            for pk, *names in queryset.iterator():
+                objects[(kind, pk)] = self._make_entries(kind, pk, names)
+        entries = sorted(entry for object_entries in objects.values() for entry in object_entries)
+        with self._lock:
+            self._entries = entries
+            self._objects = objects
+            self.version = version
+        return len(entries)
+
+    @staticmethod
+    def _make_entries(kind, pk, names):
+        return sorted({(key, kind, name, pk) for name in names if name for key in _index_keys(name)})
+
+    def update(self, kind, pk, names):
+        """
+        Replace the names of an object
+        :param names: the new names, empty if the object was deleted
+        :returns: whether the index changed
+        """
+        entries = self._make_entries(kind, pk, names)
+        with self._lock:
+            old_entries = self._objects.pop((kind, pk), [])
+            if entries:
+                self._objects[(kind, pk)] = entries
+            if entries == old_entries:
+                return False
+            for entry in old_entries:
+                position = bisect.bisect_left(self._entries, entry)
+                if position < len(self._entries) and self._entries[position] == entry:
+                    del self._entries[position]
+            for entry in entries:
+                bisect.insort(self._entries, entry)
+            return True
+
+    def apply(self, kind, pk, names, previous=None):
+        """
+        Update the index of this worker and have the other workers rebuild theirs
+        :param previous: the names of the object before the change, if known, used when
+            this worker has no index to compare with
+        """
+        if self.version is None:
+            if previous is None or {name for name in previous if name} != {name for name in names if name}:
+                suggest_cache.invalidate()
+            return
+        if not self.update(kind, pk, names):
+            return
+        previous = self.version
+        suggest_cache.invalidate()
+        version = suggest_cache.version()
+        with self._lock:
+            # otherwise another worker changed names too, which only a rebuild picks up
+            if previous is not None and version == previous + 1:
+                self.version = version
+
+    def _rebuild(self):
+        try:
+            self.build()
+        except Exception:
+            logger.exception('Unable to rebuild the suggest index')
+        finally:
+            # the connection of this thread
+            connection.close()
+            with self._lock:
+                self._rebuilding = False
+
+    def refresh(self):
+        """
+        Rebuild the index in a background thread if another worker changed names
+        :returns: the thread, None if the index is up to date or already being rebuilt
+        """
+        if self.version == suggest_cache.version():
+            return None
+        with self._lock:
+            if self._rebuilding:
+                return None
+            self._rebuilding = True
+        thread = threading.Thread(target=self._rebuild, daemon=True)
+        thread.start()
+        return thread
+
+    def suggest(self, prefix, limit=MAX_SUGGESTIONS):
+        """
+        :param prefix: the text typed so far
+        :param limit: maximum number of suggestions
+        :returns: a list of dicts with the type and name of the matching objects,
+            names matched from their start first
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        self.refresh()
+        with self._lock:
+            start = bisect.bisect_left(self._entries, (prefix,))
+            matches = []
+            for key, kind, name, pk in self._entries[start:start + MAX_SCANNED]:
+                if not key.startswith(prefix):
+                    break
+                matches.append((normalize(name) != key, len(name), name, kind))
+        suggestions = []
+        seen = set()
+        for _, _, name, kind in sorted(matches):
+            if (kind, name) not in seen:
+                seen.add((kind, name))
+                suggestions.append({'type': kind, 'name': name})
+                if len(suggestions) == limit:
+                    break
+        return suggestions
+
+
+suggest_index = SuggestIndex()
@@ -0,0 +1,967 @@
+"""
+.. See the NOTICE file distributed with this work for additional information
+   regarding copyright ownership.
+   Licensed under the Apache License, Version 2.0 (the "License");
+   you may not use this file except in compliance with the License.
+   You may obtain a copy of the License at
+       http://www.apache.org/licenses/LICENSE-2.0
+   Unless required by applicable law or agreed to in writing, software
+   distributed under the License is distributed on an "AS IS" BASIS,
+   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+   See the License for the specific language governing permissions and
+   limitations under the License.
+"""
+import gzip
+import http.client
+import json
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from trackhubs import batch, blobs, cache as tiered_cache, codec, documents, monitor, parser, query_plans, signals, stats
+from trackhubs.ingest import submit_hub
+from trackhubs.models import (Assembly, Hub, HubBatch, HubDocument, HubMonitor, HubStatusBucket, HubVersion,
+                              RegistryStat, Species, StanzaBlob, Track)
+from trackhubs.suggest import suggest_cache, suggest_index
+
+HUB_URL = 'http://example.com/hub/hub.txt'
+
+HUB_TXT = """hub test_hub
+shortLabel Test Hub
+longLabel A hub used by the test suite
+genomesFile genomes.txt
+email someone@example.com
+"""
+
+GENOMES_TXT = """genome hg38
+trackDb hg38/trackDb.txt
+"""
+
+TRACKDB_TXT = """# A comment
+track composite1
+compositeTrack on
+shortLabel Composite
+type bigWig
+
+track track1
+parent composite1
+bigDataUrl track1.bw
+shortLabel Track 1
+longLabel First track of the composite, \\
+    spread over two lines
+type bigWig
+
+track track2
+parent composite1
+bigDataUrl track2.bw
+shortLabel Track 2
+type bigWig
+"""
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache.clear()
+    tiered_cache._local.clear()
+    suggest_index.version = None
+
+
+@pytest.fixture
+def api_client():
+    from rest_framework.test import APIClient
+    return APIClient()
+
+
+@pytest.fixture
+def remote_files(monkeypatch):
+    """
+    Serve the hub files from a dict instead of fetching them,
+    tests can edit the dict to simulate changes to the remote hub
+    """
+    files = {
+        HUB_URL: HUB_TXT,
+        'http://example.com/hub/genomes.txt': GENOMES_TXT,
+        'http://example.com/hub/hg38/trackDb.txt': TRACKDB_TXT,
+    }
+    monkeypatch.setattr(parser, 'fetch_text', lambda url: files[url])
+    return files
+
+
+def test_parse_stanzas():
+    stanzas = parser.parse_stanzas(TRACKDB_TXT)
+    assert [stanza['track'] for stanza in stanzas] == ['composite1', 'track1', 'track2']
+    assert stanzas[1]['longLabel'] == 'First track of the composite, spread over two lines'
+
+
+def test_stanza_digest_ignores_setting_order():
+    assert parser.stanza_digest({'track': 'a', 'type': 'bed'}) == parser.stanza_digest({'type': 'bed', 'track': 'a'})
+    assert parser.stanza_digest({'track': 'a', 'type': 'bed'}) != parser.stanza_digest({'track': 'a', 'type': 'bam'})
+
+
+@pytest.mark.parametrize('stanza', [
+    {'track': 't1', 'type': 'bigWig'},
+    {'track': 't1', 'customSetting': 'ünïcode', 'shortLabel': 'A label ' * 20},
+])
+def test_settings_codec_roundtrip(stanza):
+    blob = codec.encode_settings(stanza)
+    assert list(codec.decode_settings(blob).items()) == list(stanza.items())
+    assert list(codec.decode_settings(memoryview(blob)).items()) == list(stanza.items())
+
+
+def test_settings_codec_is_compact():
+    stanza = parser.parse_stanzas(TRACKDB_TXT)[1]
+    assert len(codec.encode_settings(stanza)) < len(json.dumps(stanza))
+
+
+@pytest.mark.django_db
+def test_submit_hub(remote_files, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, changes = submit_hub(owner, HUB_URL)
+    assert hub.short_label == 'Test Hub'
+    assert hub.data_version == 1
+    assert changes == (3, 0, 0, 0)
+    assert Track.objects.filter(hub=hub).count() == 3
+    track = Track.objects.get(name='track1')
+    assert track.settings['bigDataUrl'] == 'track1.bw'
+    assert (track.file_type, track.parent, track.short_label) == ('bigWig', 'composite1', 'Track 1')
+
+
+@pytest.mark.django_db
+def test_resubmit_hub_applies_minimal_diff(remote_files, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    before = {track.name: track for track in Track.objects.all()}
+
+    trackdb_url = 'http://example.com/hub/hg38/trackDb.txt'
+    remote_files[trackdb_url] = remote_files[trackdb_url].replace('shortLabel Track 2', 'shortLabel Track two')
+    remote_files[trackdb_url] += '\ntrack track3\nparent composite1\nbigDataUrl track3.bw\ntype bigWig\n'
+    remote_files[trackdb_url] = remote_files[trackdb_url].replace('bigDataUrl track1.bw', 'bigDataUrl track1.bw\n#')
+    remote_files[trackdb_url] = remote_files[trackdb_url].replace('track composite1\n', 'track composite1\nvisibility full\n')
+    hub, changes = submit_hub(owner, HUB_URL)
+    assert changes == (1, 2, 0, 1)
+    assert hub.data_version == 2
+
+    after = {track.name: track for track in Track.objects.all()}
+    # untouched rows keep their identity and content, changed ones are updated in place
+    assert after['track1'].pk == before['track1'].pk
+    assert after['track1'].updated_at == before['track1'].updated_at
+    assert after['track2'].pk == before['track2'].pk
+    assert after['track2'].blob_id != before['track2'].blob_id
+
+    # removing a stanza only deletes that track, an identical resubmission changes nothing
+    remote_files[trackdb_url] = remote_files[trackdb_url].split('\ntrack track3')[0]
+    hub, changes = submit_hub(owner, HUB_URL)
+    assert changes == (0, 0, 1, 3)
+    hub, changes = submit_hub(owner, HUB_URL)
+    assert changes == (0, 0, 0, 3)
+    assert hub.data_version == 3
+
+
+@pytest.mark.django_db
+def test_resubmit_hub_other_owner(remote_files, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    other = django_user_model.objects.create_user(username='other', password='password')
+    submit_hub(owner, HUB_URL)
+    with pytest.raises(PermissionError):
+        submit_hub(other, HUB_URL)
+
+
+@pytest.mark.django_db
+def test_hub_api(remote_files, api_client, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    token, _ = Token.objects.get_or_create(user=owner)
+
+    response = api_client.post(reverse('hub_list_api'), data={'url': HUB_URL})
+    assert response.status_code == 401
+
+    api_client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    response = api_client.post(reverse('hub_list_api'), data={'url': HUB_URL})
+    assert response.status_code == 200
+    assert response.data['added'] == 3
+
+    hub = Hub.objects.get()
+    response = api_client.put(reverse('hub_detail_api', kwargs={'pk': hub.pk}))
+    assert response.status_code == 200
+    assert response.data['unchanged'] == 3
+
+    api_client.credentials()
+    response = api_client.get(reverse('hub_detail_api', kwargs={'pk': hub.pk}))
+    assert response.status_code == 200
+    assert [track['name'] for track in response.json()['genomes'][0]['tracks']] == ['composite1', 'track1', 'track2']
+
+
+@pytest.mark.django_db(transaction=True)
+def test_hub_change_refreshes_proxy_cache(remote_files, django_user_model, monkeypatch, settings):
+    settings.PROXY_CACHE_REFRESH_URL = 'http://proxy:8081'
+    refreshed = []
+    done = threading.Event()
+
+    def refresh(paths):
+        refreshed.extend(paths)
+        done.set()
+
+    monkeypatch.setattr(signals, 'refresh_proxy_cache', refresh)
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    assert done.wait(5)
+    assert reverse('hub_detail_api', kwargs={'pk': hub.pk}) in refreshed
+    assert reverse('hub_list_api') in refreshed
+
+
+def test_refresh_proxy_cache_encodings(monkeypatch, settings):
+    settings.PROXY_CACHE_REFRESH_URL = 'http://proxy:8081'
+    requested = []
+
+    def urlopen(request, timeout):
+        requested.append((request.full_url, request.get_header('Accept-encoding')))
+        raise OSError('Not found')
+    monkeypatch.setattr(signals, 'urlopen', urlopen)
+    signals.refresh_proxy_cache(['/api/trackhub/1/'])
+    assert requested == [('http://proxy:8081/api/trackhub/1/', 'identity'), ('http://proxy:8081/api/trackhub/1/', 'gzip')]
+
+
+def test_tiered_cache_hits_and_invalidation():
+    hubs = tiered_cache.TieredCache('test')
+    calls = []
+
+    def producer():
+        calls.append(1)
+        return len(calls)
+
+    assert hubs.get_or_set('a', producer) == 1
+    assert hubs.get_or_set('a', producer) == 1
+    tiered_cache._local.clear()
+    assert hubs.get_or_set('a', producer) == 1
+    assert (hubs.stats['misses'], hubs.stats['local_hits'], hubs.stats['shared_hits']) == (1, 1, 1)
+
+    hubs.delete('a')
+    assert hubs.get_or_set('a', producer) == 2
+    hubs.invalidate()
+    assert hubs.get_or_set('a', producer) == 3
+
+
+def test_tiered_cache_serves_stale_value_while_recomputing():
+    hubs = tiered_cache.TieredCache('test', timeout=0)
+    assert hubs.get_or_set('a', lambda: 'old') == 'old'
+    tiered_cache._local.clear()
+
+    # another worker holds the lock and is recomputing the value
+    key = hubs.make_key('a')
+    assert hubs._lock(key)
+    assert hubs.get_or_set('a', lambda: 'new') == 'old'
+    assert hubs.stats['stale_hits'] == 1
+
+    cache.delete(key + ':lock')
+    tiered_cache._local.clear()
+    assert hubs.get_or_set('a', lambda: 'new') == 'new'
+
+
+def test_tiered_cache_waits_for_missing_value():
+    hubs = tiered_cache.TieredCache('test')
+    key = hubs.make_key('a')
+    assert hubs._lock(key)
+
+    def store():
+        time.sleep(0.2)
+        cache.set(key, ('computed elsewhere', time.time() + 60))
+
+    threading.Thread(target=store).start()
+    assert hubs.get_or_set('a', lambda: 'computed here') == 'computed elsewhere'
+
+
+@pytest.mark.django_db(transaction=True)
+def test_hub_caches_updated_on_resubmission(remote_files, api_client, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    url = reverse('hub_detail_api', kwargs={'pk': hub.pk})
+    assert api_client.get(url).json()['short_label'] == 'Test Hub'
+    assert api_client.get(reverse('hub_list_api')).data['results'][0]['short_label'] == 'Test Hub'
+
+    remote_files[HUB_URL] = HUB_TXT.replace('Test Hub', 'Renamed Hub')
+    submit_hub(owner, HUB_URL)
+    assert api_client.get(url).json()['short_label'] == 'Renamed Hub'
+    assert api_client.get(reverse('hub_list_api')).data['results'][0]['short_label'] == 'Renamed Hub'
+    assert api_client.get(reverse('assembly_list_api')).data == [
+        {'name': 'hg38', 'accession': None, 'species': None, 'hub_count': 1}
+    ]
+
+
+@pytest.mark.django_db
+def test_hub_list_pages(api_client, admin_client, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hubs = [Hub.objects.create(owner=owner, url='http://example.com/hub{}/hub.txt'.format(number),
+                               name='hub{}'.format(number)) for number in range(3)]
+    tiered_cache.hub_list_cache.stats.clear()
+    url = reverse('hub_list_api')
+    response = api_client.get(url, {'limit': 2})
+    assert [hub['name'] for hub in response.data['results']] == ['hub0', 'hub1']
+    assert response.data['next'] == '{}?limit=2&after={}'.format(url, hubs[1].pk)
+    response = api_client.get(response.data['next'])
+    assert ([hub['name'] for hub in response.data['results']], response.data['next']) == (['hub2'], None)
+    assert api_client.get(url, {'limit': 0}).status_code == 400
+
+    # each page is cached on its own
+    stats = api_client.get(reverse('cache_stats_api'))
+    assert stats.status_code in (401, 403)
+    stats = admin_client.get(reverse('cache_stats_api')).json()['hub-list']
+    assert (stats['misses'], stats['hit_rate']) == (2, 0)
+    api_client.get(url, {'limit': 2})
+    assert admin_client.get(reverse('cache_stats_api')).json()['hub-list']['hit_rate'] == 1 / 3
+
+
+@pytest.mark.django_db
+def test_hub_document(remote_files, api_client, django_user_model, monkeypatch):
+    monkeypatch.setattr(documents, 'GZIP_MIN_SIZE', 0)
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    url = reverse('hub_detail_api', kwargs={'pk': hub.pk})
+
+    response = api_client.get(url)
+    assert response['Content-Type'] == 'application/json'
+    assert response.json()['genomes'][0]['tracks'][1]['settings']['bigDataUrl'] == 'track1.bw'
+
+    compressed = api_client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+    assert compressed['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.content) == response.content
+
+    # only the body served is read
+    with CaptureQueriesContext(connection) as queries:
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == 304
+    assert not any('"body' in query['sql'] for query in queries.captured_queries)
+    with CaptureQueriesContext(connection) as queries:
+        api_client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+    assert [query['sql'].count('"body_gzip"') for query in queries.captured_queries] == [0, 1]
+    assert not any('"body"' in query['sql'] for query in queries.captured_queries)
+    assert api_client.get(reverse('hub_detail_api', kwargs={'pk': hub.pk + 1})).status_code == 404
+
+    # documents missing or out of date are rendered on demand
+    HubDocument.objects.all().delete()
+    Hub.objects.filter(pk=hub.pk).update(short_label='Changed')
+    assert api_client.get(url).json()['short_label'] == 'Changed'
+
+
+@pytest.mark.django_db
+def test_hub_track_list(remote_files, api_client, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    url = reverse('hub_track_list_api', kwargs={'pk': hub.pk})
+
+    response = api_client.get(url, {'limit': 2})
+    assert response.status_code == 200
+    assert response.data['results'][1] == {
+        'id': Track.objects.get(name='track1').pk, 'name': 'track1', 'hub': hub.pk, 'assembly': 'hg38',
+        'type': 'bigWig', 'parent': 'composite1', 'visibility': '', 'short_label': 'Track 1',
+    }
+    response = api_client.get(response.data['next'])
+    assert [track['name'] for track in response.data['results']] == ['track2']
+    assert response.data['next'] is None
+
+    assert api_client.get(url, {'after': 'x'}).status_code == 400
+    for limit in ('0', '-1', 'x'):
+        assert api_client.get(url, {'limit': limit}).status_code == 400
+    assert api_client.get(reverse('hub_track_list_api', kwargs={'pk': hub.pk + 1})).status_code == 404
+
+
+@pytest.mark.django_db
+def test_search(remote_files, api_client, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+
+    response = api_client.get(reverse('search_api'), {'q': 'track', 'assembly': 'hg38', 'limit': 1})
+    assert [track['name'] for track in response.data['results']] == ['track1']
+    response = api_client.get(response.data['next'])
+    assert [track['name'] for track in response.data['results']] == ['track2']
+    assert api_client.get(reverse('search_api'), {'q': 'track', 'assembly': 'mm10'}).data['results'] == []
+    assert api_client.get(reverse('search_api'), {'q': 'track', 'limit': 0}).status_code == 400
+    # the hub label matches all its tracks
+    assert len(api_client.get(reverse('search_api'), {'q': 'test hub'}).data['results']) == 3
+    # disabled hubs are left out
+    Hub.objects.filter(pk=hub.pk).update(is_enabled=False)
+    assert api_client.get(reverse('search_api'), {'q': 'test hub'}).data['results'] == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_virtual_hub(remote_files, api_client, django_user_model, django_assert_num_queries):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+
+    response = api_client.post(reverse('virtual_hub_api'), {'q': ' Track ', 'assembly': 'hg38'}, format='json')
+    assert response.status_code == 201
+    hub_url = response.data['url']
+    # the same query gives the same virtual hub
+    assert api_client.post(reverse('virtual_hub_api'), {'assembly': 'hg38', 'q': 'Track'}).data['url'] == hub_url
+
+    hub_txt = b''.join(api_client.get(hub_url).streaming_content).decode()
+    assert 'genomesFile genomes.txt' in hub_txt
+    genomes_txt = b''.join(api_client.get(hub_url.replace('hub.txt', 'genomes.txt')).streaming_content).decode()
+    assert genomes_txt == 'genome hg38\ntrackDb hg38/trackDb.txt\n\n'
+
+    trackdb_url = hub_url.replace('hub.txt', 'hg38/trackDb.txt')
+    trackdb_txt = b''.join(api_client.get(trackdb_url).streaming_content).decode()
+    stanzas = parser.parse_stanzas(trackdb_txt)
+    assert [stanza['track'] for stanza in stanzas] == ['hub{0}_track1'.format(hub.pk), 'hub{0}_track2'.format(hub.pk)]
+    assert stanzas[0]['bigDataUrl'] == 'http://example.com/hub/hg38/track1.bw'
+    assert 'parent' not in stanzas[0]
+
+    # served from the cache afterwards, until a hub changes
+    with django_assert_num_queries(0):
+        assert api_client.get(trackdb_url).content.decode() == trackdb_txt
+    # from the shared tier only, the files are too large for the local one
+    assert not any(key.startswith('thr:virtual-hub:') and not key.endswith(':version')
+                   for key in tiered_cache._local._entries)
+    Hub.objects.get(pk=hub.pk).save()
+    assert api_client.get(trackdb_url).streaming
+
+    # a file generated while a hub changes isn't cached as the new version
+    response = api_client.get(trackdb_url)
+    tiered_cache.virtual_hub_cache.invalidate()
+    b''.join(response.streaming_content)
+    assert api_client.get(trackdb_url).streaming
+
+
+@pytest.mark.django_db
+def test_virtual_hub_unknown(api_client):
+    url = reverse('virtual_hub_txt', kwargs={'fingerprint': '0123456789abcdef'})
+    assert api_client.get(url).status_code == 404
+
+
+def test_monitor_next_interval(monkeypatch):
+    monkeypatch.setattr(monitor, 'JITTER', 0)
+    state = HubMonitor(interval=monitor.DEFAULT_INTERVAL)
+
+    # stable hubs are checked less and less often
+    assert monitor.next_interval(state, True) == monitor.DEFAULT_INTERVAL * 1.5
+    for _ in range(20):
+        monitor.next_interval(state, True)
+    assert state.interval == monitor.MAX_INTERVAL
+
+    # a new failure is confirmed quickly, then checks back off exponentially
+    assert monitor.next_interval(state, False) == monitor.MIN_INTERVAL
+    assert monitor.next_interval(state, False) == monitor.MIN_INTERVAL * 2
+    assert monitor.next_interval(state, False) == monitor.MIN_INTERVAL * 4
+    for _ in range(20):
+        monitor.next_interval(state, False)
+    assert state.interval == monitor.MAX_BACKOFF
+
+    # flapping hubs are checked often
+    for is_up in (True, False, True, False, True):
+        monitor.next_interval(state, is_up)
+    assert state.flaps >= monitor.FLAP_THRESHOLD
+    assert monitor.next_interval(state, True) == monitor.MIN_INTERVAL
+
+
+@pytest.mark.django_db
+def test_monitor_run_checks(remote_files, django_user_model, monkeypatch):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    monkeypatch.setattr(monitor, 'HOST_DELAY', 0)
+    probed = []
+
+    def probe(url):
+        probed.append(url)
+        return len(probed) != 2, 100, ''
+
+    monkeypatch.setattr(monitor, 'probe', probe)
+
+    # the first check of a new hub is spread over the default interval
+    assert monitor.run_checks() == 0
+    for _ in range(3):
+        HubMonitor.objects.update(next_check_at=timezone.now())
+        assert monitor.run_checks() == 1
+    state = HubMonitor.objects.get()
+    assert state.is_up and state.flaps == 2 and state.interval == monitor.MIN_INTERVAL
+
+    bucket = HubStatusBucket.objects.get()
+    assert (bucket.resolution, bucket.probes, bucket.failures, bucket.total_latency_ms) == (monitor.HOUR, 3, 1, 300)
+
+
+def test_monitor_probe_malformed_response(monkeypatch):
+    def urlopen(request, timeout):
+        raise http.client.BadStatusLine('garbage')
+
+    monkeypatch.setattr(monitor, 'urlopen', urlopen)
+    is_up, _, error = monitor.probe(HUB_URL)
+    assert not is_up and error == 'garbage'
+
+
+@pytest.mark.django_db
+def test_monitor_checks_shared_between_hosts(django_user_model, monkeypatch):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    for number in range(3):
+        Hub.objects.create(owner=owner, url='http://busy.example.com/hub{}/hub.txt'.format(number))
+    Hub.objects.create(owner=owner, url='http://quiet.example.com/hub.txt')
+    monitor.ensure_monitors()
+    # the busy host's hubs are due first
+    for position, state in enumerate(HubMonitor.objects.select_related('hub').order_by('hub__url')):
+        HubMonitor.objects.filter(pk=state.pk).update(next_check_at=timezone.now() - timedelta(minutes=10 - position))
+    monkeypatch.setattr(monitor, 'HOST_DELAY', 0)
+    monkeypatch.setattr(monitor, 'MAX_CHECKS_PER_HOST', 1)
+    probed = []
+
+    def probe(url):
+        probed.append(url)
+        return True, 100, ''
+
+    monkeypatch.setattr(monitor, 'probe', probe)
+    assert monitor.run_checks(batch_size=2) == 2
+    assert sorted(probed) == ['http://busy.example.com/hub0/hub.txt', 'http://quiet.example.com/hub.txt']
+
+
+@pytest.mark.django_db
+def test_monitor_compact_history(remote_files, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    day = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=10)
+    for hour in range(24):
+        HubStatusBucket.objects.create(hub=hub, resolution=monitor.HOUR, start=day + timedelta(hours=hour),
+                                       probes=2, failures=int(hour == 0), total_latency_ms=10)
+    recent = HubStatusBucket.objects.create(hub=hub, resolution=monitor.HOUR, start=timezone.now(), probes=1)
+
+    assert monitor.compact_history() == 24
+    daily = HubStatusBucket.objects.get(resolution=monitor.DAY)
+    assert (daily.start, daily.probes, daily.failures, daily.total_latency_ms) == (day, 48, 1, 240)
+    assert HubStatusBucket.objects.filter(pk=recent.pk).exists()
+    assert monitor.uptime(hub, day) == 1 - 1 / 49
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('model', [
+    'species', 'assembly', 'hub', 'genome', 'track', 'hubdocument', 'hubmonitor', 'hubstatusbucket', 'savedsearch',
+    'hubbatch', 'hubversion',
+])
+def test_admin(remote_files, admin_client, django_user_model, model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    submit_hub(owner, HUB_URL)
+    monitor.ensure_monitors()
+    response = admin_client.get(reverse('admin:trackhubs_{}_changelist'.format(model)), {'q': 'track'})
+    assert response.status_code == 200
+    if model == 'track':
+        track = Track.objects.get(name='track1')
+        response = admin_client.get(reverse('admin:trackhubs_track_change', args=[track.pk]))
+        assert b'track1.bw' in response.content
+
+
+@pytest.mark.django_db
+def test_admin_hub_change_updates_detail(remote_files, admin_client, api_client, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    detail_url = reverse('hub_detail_api', kwargs={'pk': hub.pk})
+    assert api_client.get(detail_url).json()['short_label'] == 'Test Hub'
+
+    response = admin_client.post(reverse('admin:trackhubs_hub_change', args=[hub.pk]), {
+        'owner': owner.pk, 'url': hub.url, 'name': hub.name, 'short_label': 'Edited Hub',
+        'long_label': hub.long_label, 'email': hub.email, 'is_enabled': 'on',
+    })
+    assert response.status_code == 302
+    detail = api_client.get(detail_url).json()
+    assert (detail['short_label'], detail['data_version']) == ('Edited Hub', hub.data_version + 1)
+
+
+def stored_stats():
+    return {(stat.facet, stat.value): stat.count for stat in RegistryStat.objects.exclude(count=0)}
+
+
+@pytest.mark.django_db
+def test_registry_stats_maintained_incrementally(remote_files, django_user_model, client):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    assert stored_stats() == {
+        ('total', 'hubs'): 1, ('total', 'genomes'): 1, ('total', 'tracks'): 3,
+        ('assembly', 'hg38'): 1, ('file_type', 'bigWig'): 3,
+    }
+
+    trackdb_url = 'http://example.com/hub/hg38/trackDb.txt'
+    remote_files[trackdb_url] = remote_files[trackdb_url].replace('bigDataUrl track2.bw\nshortLabel Track 2\ntype bigWig',
+                                                                  'bigDataUrl track2.bb\nshortLabel Track 2\ntype bigBed 6')
+    remote_files[trackdb_url] += '\ntrack track3\nparent composite1\nbigDataUrl track3.bam\ntype bam\n'
+    submit_hub(owner, HUB_URL)
+    assert stored_stats() == dict(stats.compute_stats())
+    assert stored_stats()[('file_type', 'bigWig')] == 2
+
+    response = client.get(reverse('thr_home'))
+    assert ('tracks', 4) in response.context['stats']['total']
+
+    hub.delete()
+    assert stored_stats() == {}
+
+
+@pytest.mark.django_db
+def test_registry_stats_count_hubs_per_species(remote_files, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    assert hub.genomes.get().assembly.species is None
+    # another hub declares the species of hg38, and of a second human assembly
+    remote_files['http://example.com/human/hub.txt'] = HUB_TXT
+    remote_files['http://example.com/human/genomes.txt'] = (
+        'genome hg38\nscientificName Homo sapiens\ntrackDb hg38/trackDb.txt\n\n'
+        'genome hg19\nscientificName Homo sapiens\ntrackDb hg19/trackDb.txt\n'
+    )
+    remote_files['http://example.com/human/hg38/trackDb.txt'] = TRACKDB_TXT
+    remote_files['http://example.com/human/hg19/trackDb.txt'] = TRACKDB_TXT
+    human, _ = submit_hub(owner, 'http://example.com/human/hub.txt')
+    assert Assembly.objects.get(name='hg38').species.scientific_name == 'Homo sapiens'
+    assert stored_stats()[('species', 'Homo sapiens')] == 2
+    assert stored_stats() == dict(stats.compute_stats())
+
+    human.delete()
+    assert stored_stats()[('species', 'Homo sapiens')] == 1
+    assert stored_stats() == dict(stats.compute_stats())
+
+
+@pytest.mark.django_db
+def test_reconcile_stats(remote_files, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    submit_hub(owner, HUB_URL)
+    # changes made behind the back of the ingestion make the statistics drift
+    Assembly.objects.filter(name='hg38').update(species=Species.objects.create(scientific_name='Homo sapiens'))
+    Track.objects.filter(name='track2').delete()
+    RegistryStat.objects.create(facet='assembly', value='gone', count=2)
+
+    out = StringIO()
+    call_command('reconcile_stats', stdout=out)
+    assert out.getvalue() == '4 statistics fixed\n'
+    assert stored_stats() == dict(stats.compute_stats())
+    assert stored_stats()[('species', 'Homo sapiens')] == 1
+
+
+def suggested(api_client, prefix):
+    response = api_client.get(reverse('suggest_api'), {'q': prefix})
+    assert response.status_code == 200
+    return [(suggestion['type'], suggestion['name']) for suggestion in response.data['suggestions']]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_suggest(remote_files, django_user_model, api_client):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    homo_sapiens = Species.objects.create(scientific_name='Homo sapiens', taxon_id=9606)
+    Species.objects.create(scientific_name='Homo neanderthalensis')
+    Assembly.objects.create(name='hg38', accession='GCA_000001405.15', species=homo_sapiens)
+    Assembly.objects.create(name='GRCh37', accession='GCA_000001405.1', species=homo_sapiens)
+    assert suggest_index.build() == 8
+
+    assert suggested(api_client, '') == []
+    assert suggested(api_client, 'HOMO') == [('species', 'Homo sapiens'), ('species', 'Homo neanderthalensis')]
+    # words after the first one match too, after the names they start
+    assert suggested(api_client, 'sap') == [('species', 'Homo sapiens')]
+    assert suggested(api_client, 'gca_000001405.1') == [('assembly', 'GCA_000001405.1'),
+                                                        ('assembly', 'GCA_000001405.15')]
+    assert suggested(api_client, 'test') == []
+
+    # the index is updated in place, without being rebuilt
+    hub, _ = submit_hub(owner, HUB_URL)
+    version = suggest_index.version
+    assert suggested(api_client, 'test') == [('hub', 'Test Hub')]
+    Hub.objects.filter(pk=hub.pk).update(short_label='Renamed')
+    assert suggested(api_client, 'hub') == [('hub', 'Test Hub')]
+    hub.delete()
+    assert suggested(api_client, 'test') == []
+    assert suggest_index.version == version + 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_suggest_rebuilt_after_changes_in_other_workers(django_user_model, api_client, monkeypatch):
+    Species.objects.create(scientific_name='Homo sapiens')
+    suggest_index.build()
+    # added by another worker, which doesn't update the index of this one
+    Species.objects.bulk_create([Species(scientific_name='Mus musculus')])
+    # as done on commit by the worker making the change
+    suggest_cache.invalidate()
+
+    build = suggest_index.build
+    release = threading.Event()
+
+    def slow_build():
+        release.wait(5)
+        return build()
+    monkeypatch.setattr(suggest_index, 'build', slow_build)
+    # the current index is served while the new one is built in the background
+    assert suggested(api_client, 'mus') == []
+    assert suggested(api_client, 'homo') == [('species', 'Homo sapiens')]
+    assert suggest_index.refresh() is None
+    release.set()
+    deadline = time.monotonic() + 5
+    while suggest_index.version != suggest_cache.version() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert suggested(api_client, 'mus') == [('species', 'Mus musculus')]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_suggest_changes_without_index(remote_files, django_user_model):
+    # as in run_hub_batches, which never builds the index
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    # registered by another process
+    Hub.objects.bulk_create([Hub(owner=owner, url=HUB_URL, name='Test', short_label='Test Hub')])
+    Assembly.objects.bulk_create([Assembly(name='hg38')])
+    version = suggest_cache.version()
+    hub, _ = submit_hub(owner, HUB_URL)
+    assert (suggest_cache.version(), suggest_index.version) == (version, None)
+    hub.short_label = 'Renamed'
+    hub.save()
+    assert suggest_cache.version() == version + 1
+
+
+def batch_hubs(django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    other = django_user_model.objects.create_user(username='other', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    hubs = [hub] + [
+        Hub.objects.create(owner=owner, url='http://example.com/hub{}/hub.txt'.format(number), name='hub{}'.format(number))
+        for number in (2, 3)
+    ]
+    hubs.append(Hub.objects.create(owner=other, url='http://example.com/other/hub.txt', name='other'))
+    return owner, hubs
+
+
+@pytest.mark.django_db
+def test_hub_batch(remote_files, api_client, django_user_model):
+    owner, (hub, hub2, hub3, other_hub) = batch_hubs(django_user_model)
+    api_client.force_authenticate(owner)
+    url = reverse('hub_batch_api')
+
+    response = api_client.post(url, {'operations': [{'action': 'publish', 'hub': hub.pk}]}, format='json')
+    assert response.status_code == 400
+    # the batch is validated as a whole, nothing is applied when an operation is invalid
+    response = api_client.post(url, {'operations': [
+        {'action': 'delete', 'hub': hub3.pk},
+        {'action': 'disable', 'hub': other_hub.pk},
+        {'action': 'enable', 'hub': hub3.pk},
+    ]}, format='json')
+    assert response.status_code == 400
+    assert set(response.data['errors']) == {1, 2}
+    assert Hub.objects.count() == 4
+
+    response = api_client.post(url, {'operations': [
+        {'action': 'disable', 'hub': hub.pk},
+        {'action': 'disable', 'hub': hub2.pk},
+        {'action': 'delete', 'hub': hub3.pk},
+    ]}, format='json')
+    assert response.status_code == 200
+    assert [(result['hub'], result['status']) for result in response.data['results']] == [
+        (hub.pk, 'ok'), (hub2.pk, 'ok'), (hub3.pk, 'ok'),
+    ]
+    assert not Hub.objects.filter(pk=hub3.pk).exists()
+    assert api_client.get(reverse('search_api'), {'q': 'track'}).data['results'] == []
+    # the documents are rendered by the batch, not by the next read
+    assert HubDocument.objects.get(hub=hub).data_version == hub.data_version + 1
+    detail = api_client.get(reverse('hub_detail_api', kwargs={'pk': hub.pk})).json()
+    assert (detail['is_enabled'], detail['data_version']) == (False, hub.data_version + 1)
+
+    response = api_client.post(url, {'operations': [
+        {'action': 'enable', 'hub': hub.pk},
+        {'action': 'enable', 'hub': hub2.pk},
+    ]}, format='json')
+    assert [result['status'] for result in response.data['results']] == ['ok', 'ok']
+    assert len(api_client.get(reverse('search_api'), {'q': 'track'}).data['results']) == 2
+
+    response = api_client.post(url, {'operations': [{'action': 'refresh', 'hub': hub.pk}]}, format='json')
+    assert response.data['results'] == [{
+        'index': 0, 'action': 'refresh', 'hub': hub.pk, 'status': 'ok', 'data_version': hub.data_version + 2,
+        'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 3,
+    }]
+
+
+@pytest.mark.django_db
+def test_hub_batch_in_background(remote_files, api_client, django_user_model):
+    owner, (hub, hub2, hub3, other_hub) = batch_hubs(django_user_model)
+    api_client.force_authenticate(owner)
+    response = api_client.post(reverse('hub_batch_api'), {'background': True, 'operations': [
+        {'action': 'disable', 'hub': hub.pk},
+        {'action': 'delete', 'hub': hub2.pk},
+    ]}, format='json')
+    assert response.status_code == 202
+    batch_url = response.data['url']
+    assert api_client.get(batch_url).data['status'] == 'queued'
+    assert Hub.objects.filter(pk=hub2.pk).exists()
+
+    # the hub is deleted before the batch runs
+    Hub.objects.filter(pk=hub.pk).delete()
+    out = StringIO()
+    call_command('run_hub_batches', stdout=out)
+    assert out.getvalue() == 'Batch {} done\n'.format(HubBatch.objects.get().pk)
+    response = api_client.get(batch_url)
+    assert response.data['status'] == 'done'
+    assert [(result['hub'], result['status']) for result in response.data['results']] == [
+        (hub.pk, 'error'), (hub2.pk, 'ok'),
+    ]
+    assert not Hub.objects.filter(pk=hub2.pk).exists()
+
+    api_client.force_authenticate(other_hub.owner)
+    assert api_client.get(batch_url).status_code == 404
+
+
+@pytest.mark.django_db
+def test_hub_batch_refreshes_in_background(remote_files, api_client, django_user_model, monkeypatch):
+    owner, (hub, hub2, hub3, other_hub) = batch_hubs(django_user_model)
+    api_client.force_authenticate(owner)
+    monkeypatch.setattr(batch, 'MAX_SYNC_REFRESHES', 2)
+    response = api_client.post(reverse('hub_batch_api'), {'operations': [
+        {'action': 'refresh', 'hub': pk} for pk in (hub.pk, hub2.pk, hub3.pk)
+    ]}, format='json')
+    assert response.status_code == 202
+
+    # a malformed response only fails its operation
+    def fetch_text(url):
+        if url == hub2.url:
+            raise http.client.BadStatusLine('garbage')
+        if url not in remote_files:
+            raise OSError('Not found')
+        return remote_files[url]
+    monkeypatch.setattr(parser, 'fetch_text', fetch_text)
+    batch.run_queued_batch()
+    results = api_client.get(response.data['url']).data['results']
+    assert [result['status'] for result in results] == ['ok', 'error', 'error']
+    assert results[1]['error'].startswith('Unable to fetch the hub')
+
+
+@pytest.mark.django_db
+def test_hub_batch_failure(remote_files, api_client, django_user_model, monkeypatch):
+    owner, (hub, hub2, hub3, other_hub) = batch_hubs(django_user_model)
+    queued = batch.queue_batch(owner, [{'action': 'disable', 'hub': hub.pk}])
+    batch.queue_batch(owner, [{'action': 'disable', 'hub': hub2.pk}])
+    calls = []
+
+    def run_operations(owner, operations, progress):
+        calls.append(operations)
+        if len(calls) == 1:
+            raise RuntimeError('unexpected')
+        return []
+    monkeypatch.setattr(batch, 'run_operations', run_operations)
+    out, err = StringIO(), StringIO()
+    call_command('run_hub_batches', stdout=out, stderr=err)
+    # the next batch is still run
+    assert len(calls) == 2
+    assert err.getvalue() == 'Batch {} failed: unexpected\n'.format(queued.pk)
+    api_client.force_authenticate(owner)
+    data = api_client.get(reverse('hub_batch_detail_api', kwargs={'pk': queued.pk})).data
+    assert (data['status'], data['error'], data['results']) == ('failed', 'unexpected', None)
+
+
+@pytest.mark.django_db
+def test_hub_batch_interrupted(remote_files, django_user_model):
+    owner, (hub, hub2, hub3, other_hub) = batch_hubs(django_user_model)
+    interrupted = batch.queue_batch(owner, [{'action': 'disable', 'hub': hub.pk}])
+    # the worker running it was killed
+    started_at = timezone.now() - timedelta(minutes=1)
+    HubBatch.objects.filter(pk=interrupted.pk).update(
+        started_at=started_at, lease_expires_at=started_at + batch.LEASE_TIMEOUT, attempts=1)
+    assert batch.run_queued_batch() is None
+
+    HubBatch.objects.filter(pk=interrupted.pk).update(lease_expires_at=timezone.now())
+    interrupted = batch.run_queued_batch()
+    assert (interrupted.attempts, interrupted.error, interrupted.finished_at is not None) == (2, '', True)
+    assert not Hub.objects.get(pk=hub.pk).is_enabled
+
+    # one the workers never get through
+    failing = batch.queue_batch(owner, [{'action': 'disable', 'hub': hub2.pk}])
+    HubBatch.objects.filter(pk=failing.pk).update(
+        started_at=started_at, lease_expires_at=started_at, attempts=batch.MAX_BATCH_ATTEMPTS)
+    failing = batch.run_queued_batch()
+    assert (failing.error, failing.results) == ('Interrupted 3 times', '')
+    assert Hub.objects.get(pk=hub2.pk).is_enabled
+
+
+@pytest.mark.django_db(transaction=True)
+def test_query_plans_match_baseline():
+    baseline = query_plans.load_baseline()
+    assert baseline is not None, 'No query plan baseline for this database'
+    regressions, _ = query_plans.compare(query_plans.check_plans(query_plans.seed()), baseline)
+    assert regressions == []
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.skipif(connection.vendor == 'mysql', reason='--current-database is not supported on MySQL')
+def test_check_query_plans(monkeypatch, tmp_path):
+    out = StringIO()
+    call_command('check_query_plans', '--current-database', stdout=out)
+    assert 'no regression' in out.getvalue()
+    # the seeded data is rolled back
+    assert not Hub.objects.exists()
+
+    monkeypatch.setattr(query_plans, 'BASELINE_PATH', str(tmp_path / 'query_plans.json'))
+    with pytest.raises(CommandError, match='No baseline for sqlite(.|\n)*search_text: full scan of U0'):
+        call_command('check_query_plans', '--current-database', stdout=out)
+
+
+def test_query_plan_flags():
+    plan, flags = query_plans._mysql_plan([
+        {'table': 'trackhubs_hub', 'type': 'ref', 'key': 'trackhubs_hub_owner_id', 'Extra': 'Using filesort'},
+        {'table': 'auth_user', 'type': 'ALL', 'key': None, 'Extra': None},
+    ])
+    assert plan == ['trackhubs_hub: ref trackhubs_hub_owner_id Using filesort', 'auth_user: ALL None']
+    assert flags == ['filesort for trackhubs_hub', 'full scan of auth_user']
+
+    plan, flags = query_plans._sqlite_plan([
+        'SEARCH TABLE trackhubs_hub USING INDEX trackhubs_hub_owner_id (owner_id=?)',
+        'SCAN auth_user USING COVERING INDEX auth_user_username',
+        'USE TEMP B-TREE FOR ORDER BY',
+    ])
+    assert plan[0] == 'SEARCH trackhubs_hub USING INDEX trackhubs_hub_owner_id (owner_id=?)'
+    assert flags == ['full index scan of auth_user', 'filesort for ORDER BY']
+
+    baseline = {'dashboard': {'plan': ['SEARCH trackhubs_hub'], 'flags': []}}
+    plans = {'dashboard': {'plan': ['SCAN trackhubs_hub'], 'flags': ['full scan of trackhubs_hub']}}
+    regressions, changes = query_plans.compare(plans, baseline)
+    assert regressions == [('dashboard', 'full scan of trackhubs_hub')]
+    assert changes == [('dashboard', 'SEARCH trackhubs_hub -> SCAN trackhubs_hub')]
+
+
+@pytest.mark.django_db
+def test_stanza_blobs_shared_by_versions_and_hubs(remote_files, django_user_model):
+    owner = django_user_model.objects.create_user(username='owner', password='password')
+    hub, _ = submit_hub(owner, HUB_URL)
+    trackdb_url = 'http://example.com/hub/hg38/trackDb.txt'
+    remote_files[trackdb_url] = remote_files[trackdb_url].replace('shortLabel Track 2', 'shortLabel Track two')
+    submit_hub(owner, HUB_URL)
+    # a copy of the hub published elsewhere
+    remote_files['http://example.com/copy/hub.txt'] = HUB_TXT
+    remote_files['http://example.com/copy/genomes.txt'] = GENOMES_TXT
+    remote_files['http://example.com/copy/hg38/trackDb.txt'] = TRACKDB_TXT
+    copy, _ = submit_hub(owner, 'http://example.com/copy/hub.txt')
+
+    # both versions of the hub and its copy share the blobs of the identical stanzas
+    assert StanzaBlob.objects.count() == 4
+    assert hub.versions.count() == 2
+    first_version = blobs.load_version(hub.versions.get(data_version=1))
+    assert first_version['hub']['shortLabel'] == 'Test Hub'
+    assert first_version['genomes'][0]['stanzas'] == parser.parse_stanzas(TRACKDB_TXT)
+    assert blobs.load_version(hub.versions.get(data_version=2))['genomes'][0]['stanzas'][2]['shortLabel'] == 'Track two'
+
+    out = StringIO()
+    call_command('collect_stanza_blobs', '--grace', '0', stdout=out)
+    assert out.getvalue() == '0 unreferenced blobs deleted\n'
+    hub.delete()
+    assert blobs.collect_garbage(grace=timedelta(0), dry_run=True) == 1
+    # blobs may belong to an ingestion in progress
+    assert blobs.collect_garbage() == 0
+    assert blobs.collect_garbage(grace=timedelta(0)) == 1
+    assert StanzaBlob.objects.count() == 3
+    assert [track.settings['shortLabel'] for track in Track.objects.order_by('pk')] == [
+        'Composite', 'Track 1', 'Track 2',
+    ]
+    assert HubVersion.objects.filter(hub=copy).count() == 1
+
+
+@pytest.mark.django_db
+def test_stanza_blobs_reused_during_collection(monkeypatch):
+    blobs.store_blobs({parser.stanza_digest(stanza): stanza for stanza in parser.parse_stanzas(TRACKDB_TXT)})
+    reused = StanzaBlob.objects.order_by('digest').first().digest
+    delete_blobs = blobs._delete_blobs
+
+    def racing_delete_blobs(digests):
+        # as the database does for a track of an ingestion in progress
+        if reused in digests:
+            raise IntegrityError('FOREIGN KEY constraint failed')
+        return delete_blobs(digests)
+    monkeypatch.setattr(blobs, '_delete_blobs', racing_delete_blobs)
+    assert blobs.collect_garbage(grace=timedelta(0)) == 2
+    assert list(StanzaBlob.objects.values_list('digest', flat=True)) == [reused]
@@ -13,5 +13,29 @@
 """
 
 from django.contrib import admin
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from rest_framework.authtoken.admin import TokenAdmin
+from rest_framework.authtoken.models import Token
 
-# Register your models here.
+from thr_web.admin import LargeTableAdmin
+
+
+class LargeUserAdmin(LargeTableAdmin, UserAdmin):
+    """
+    User admin searching on the indexed username only
+    """
+    search_fields = ('^username',)
+    list_filter = ('is_staff', 'is_superuser')
+
+
+class LargeTokenAdmin(LargeTableAdmin, TokenAdmin):
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+    search_fields = ('^user__username',)
+
+
+admin.site.unregister(User)
+admin.site.register(User, LargeUserAdmin)
+admin.site.unregister(Token)
+admin.site.register(Token, LargeTokenAdmin)
@@ -123,3 +123,9 @@ def test_auth_view(auto_login_user):
     response = client.get(url)
     assert response.status_code == 200
 
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', ['admin:auth_user_changelist', 'admin:authtoken_token_changelist'])
+def test_admin_changelist(admin_client, url):
+    response = admin_client.get(reverse(url), {'q': 'adm'})
+    assert response.status_code == 200
@@ -19,9 +19,24 @@ from django.views.generic import CreateView, TemplateView
 from .forms import CustomUserCreationForm
 
 
+MAX_DASHBOARD_HUBS = 100
+
+
+def dashboard_hubs(user):
+    """
+    :returns: the hubs of a user, most recently updated first
+    """
+    return user.hubs.order_by('-updated_at')[:MAX_DASHBOARD_HUBS]
+
+
 class DashboardView(TemplateView):
     template_name = 'user/dashboard.html'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['hubs'] = dashboard_hubs(self.request.user)
+        return context
+
 
 class RegistrationView(SuccessMessageMixin, CreateView):
     template_name = 'user/register.html'